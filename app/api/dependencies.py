@@ -0,0 +1,31 @@
+import threading
+
+from fastapi import FastAPI, Request
+
+from ..services.llm_service import LLMService
+from ..services.vector_store import VectorStoreService
+
+_init_lock = threading.Lock()
+
+
+def init_services(app: FastAPI) -> LLMService:
+    """Create the shared services on ``app.state`` and start warming the index in the background."""
+    with _init_lock:
+        if getattr(app.state, "llm_service", None) is None:
+            vector_store_service = VectorStoreService(eager_load=False)
+            app.state.vector_store_service = vector_store_service
+            app.state.llm_service = LLMService(vector_store_service)
+            vector_store_service.start_background_load()
+    return app.state.llm_service
+
+
+def get_llm_service(request: Request) -> LLMService:
+    llm_service = getattr(request.app.state, "llm_service", None)
+    if llm_service is None:
+        # Lifespan did not run (e.g. a TestClient used without a context manager)
+        llm_service = init_services(request.app)
+    return llm_service
+
+
+def get_vector_store_service(request: Request) -> VectorStoreService:
+    return get_llm_service(request).vector_store_service
@@ -1,37 +1,132 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.metrics import StageTimer, render_metrics
 from ..models.schemas import PostRequest, PostResponse, PostChoice, ClientResponse, GeneratedPost, UserType
 from ..db import crud
-from ..db.database import get_db
+from ..db.database import AsyncSessionLocal, get_async_db
 from ..services.llm_service import LLMService
 from ..services.vector_store import VectorStoreService
+from .dependencies import get_llm_service, get_vector_store_service
 import uuid
 
-# Initialize services as singletons
-vector_store_service = VectorStoreService()
-llm_service = LLMService(vector_store_service)
-
 router = APIRouter()
 
-@router.post("/generate_post", response_model=PostResponse)
-def generate_post(request: PostRequest, db: Session = Depends(get_db)):
-    # Get or create user to determine user type
-    user = crud.get_or_create_user(db, request.user_id)
-    
+def _resolve_user_type(user) -> UserType:
     # Convert database user type to schema UserType enum
     try:
         # Handle the case where user.user_type might be a SQLAlchemy Column object
         if hasattr(user, 'user_type') and user.user_type is not None:
             if isinstance(user.user_type, str):
-                user_type = UserType(user.user_type)
-            else:
-                # If it's a Column or other object, try to get its string value
-                user_type = UserType(str(user.user_type.value))
-        else:
-            user_type = UserType.BEGINNER
+                return UserType(user.user_type)
+            # If it's a Column or other object, try to get its string value
+            return UserType(str(user.user_type.value))
+        return UserType.BEGINNER
     except (ValueError, AttributeError):
         # Default to BEGINNER if conversion fails
-        user_type = UserType.BEGINNER
+        return UserType.BEGINNER
+
+async def _lookup_user(user_id: str):
+    # Short-lived session: a request-scoped one would hold a pooled connection for the whole Azure call
+    async with AsyncSessionLocal() as db:
+        return await crud.aget_or_create_user(db, user_id)
+
+async def _save_generated_posts(request: PostRequest, contents):
+    async with AsyncSessionLocal() as db:
+        return await crud.asave_posts(
+            db=db,
+            user_id=request.user_id,
+            query=request.query,
+            contents=contents,
+            client_id=request.client_id
+        )
+
+@router.post("/generate_post", response_model=PostResponse)
+async def generate_post(
+    request: PostRequest,
+    response: Response,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    timer = StageTimer("generate_post")
+    try:
+        # Get or create user to determine user type
+        with timer.stage("user_lookup"):
+            user = await _lookup_user(request.user_id)
+        user_type = _resolve_user_type(user)
+        timer.tier = user_type.value
+        
+        # For PRO users and copywriters, generate multiple options
+        if user_type in [UserType.PRO, UserType.COPYWRITER]:
+            num_posts = 2
+            is_pro = True
+        else:
+            num_posts = 1
+            is_pro = False
+        
+        # Generate the posts
+        generated_posts = []
+        
+        client_key = request.client_id or request.user_id  # Use client_id if available, otherwise user_id
+        
+        # Run the similar-post search once and share it between the prompt and the response
+        example_filter = request.example_filter.model_dump() if request.example_filter else None
+        with timer.stage("retrieval"):
+            retrieval_context = await run_in_threadpool(
+                llm_service.build_retrieval_context, request.query, client_key, filters=example_filter
+            )
+        similar_posts_text = [doc.page_content for doc in retrieval_context.documents]
+        
+        # Generate every draft from one prompt with a single multi-choice completion
+        post_contents = await llm_service.agenerate_posts(
+            query=request.query,
+            client_id=client_key,
+            is_pro_user=is_pro,
+            num_candidates=num_posts,
+            retrieval_context=retrieval_context,
+            use_cache=llm_service.response_cache_enabled_for(user_type.value),
+            user_tier=user_type.value,
+            timer=timer
+        )
+        
+        with timer.stage("save_posts"):
+            # Save every draft in one transaction
+            post_ids = await _save_generated_posts(request, post_contents)
+        
+        # Add to response list
+        for post_id, post_content in zip(post_ids, post_contents):
+            generated_posts.append(
+                GeneratedPost(
+                    post_id=post_id,
+                    content=post_content
+                )
+            )
+        
+        response.headers["Server-Timing"] = timer.server_timing()
+        return PostResponse(
+            posts=generated_posts,
+            user_type=user_type,
+            similar_posts=similar_posts_text if similar_posts_text else None
+        )
+    finally:
+        timer.finish()
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/generate_post/stream")
+async def generate_post_stream(
+    request: PostRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    # Streams the drafts as Server-Sent Events: "meta", then indexed "token" deltas, then "done" with the saved posts
+    timer = StageTimer("generate_post_stream")
+    with timer.stage("user_lookup"):
+        user = await _lookup_user(request.user_id)
+    user_type = _resolve_user_type(user)
+    timer.tier = user_type.value
     
     # For PRO users and copywriters, generate multiple options
     if user_type in [UserType.PRO, UserType.COPYWRITER]:
@@ -41,63 +136,129 @@ def generate_post(request: PostRequest, db: Session = Depends(get_db)):
         num_posts = 1
         is_pro = False
     
-    # Generate the posts
-    generated_posts = []
-    similar_posts_text = []
-    
-    # Get similar posts for context
-    similar_docs = vector_store_service.search_similar_posts(request.query, k=3)
-    if similar_docs:
-        similar_posts_text = [doc.page_content for doc in similar_docs]
+    client_key = request.client_id or request.user_id  # Use client_id if available, otherwise user_id
     
-    # Generate multiple posts if needed
-    for _ in range(num_posts):
-        post_content = llm_service.generate_post(
-            query=request.query,
-            client_id=request.client_id or request.user_id,  # Use client_id if available, otherwise user_id
-            is_pro_user=is_pro
+    example_filter = request.example_filter.model_dump() if request.example_filter else None
+    with timer.stage("retrieval"):
+        retrieval_context = await run_in_threadpool(
+            llm_service.build_retrieval_context, request.query, client_key, filters=example_filter
         )
+    similar_posts_text = [doc.page_content for doc in retrieval_context.documents]
+    
+    async def event_stream():
+        try:
+            async for event in _stream_events():
+                yield event
+        finally:
+            # Runs when the stream completes, fails or the client disconnects
+            timer.finish()
+    
+    async def _stream_events():
+        yield _sse_event("meta", {
+            "user_type": user_type.value,
+            "num_posts": num_posts,
+            "similar_posts": similar_posts_text or None
+        })
         
-        # Save the post in the database
-        post_id = crud.save_post(
-            db=db,
-            user_id=request.user_id,
-            query=request.query,
-            content=post_content,
-            client_id=request.client_id
-        )
+        parts = [[] for _ in range(num_posts)]
+        saved = {}
         
-        # Add to response list
-        generated_posts.append(
-            GeneratedPost(
-                post_id=post_id,
-                content=post_content
-            )
-        )
+        async def persist(contents):
+            # Awaited by astream_posts before client memory is updated, so unsaved drafts never enter the history
+            if not contents:
+                return
+            try:
+                with timer.stage("save_posts"):
+                    saved["post_ids"] = await _save_generated_posts(request, contents)
+            except Exception as exc:
+                saved["error"] = exc
+                raise
+        
+        try:
+            async for index, delta in llm_service.astream_posts(
+                query=request.query,
+                client_id=client_key,
+                is_pro_user=is_pro,
+                num_candidates=num_posts,
+                retrieval_context=retrieval_context,
+                use_cache=llm_service.response_cache_enabled_for(user_type.value),
+                user_tier=user_type.value,
+                timer=timer,
+                on_complete=persist
+            ):
+                parts[index].append(delta)
+                yield _sse_event("token", {"index": index, "delta": delta})
+        except Exception as exc:
+            # Tokens may already be out, so failures travel as an event rather than a status code
+            if "error" in saved:
+                print(f"Error saving streamed posts: {exc}")
+                yield _sse_event("error", {"detail": "Your LinkedIn post was generated but could not be saved. Please try again."})
+            else:
+                print(f"Error streaming post: {exc}")
+                yield _sse_event("error", {"detail": "Error while generating your LinkedIn post. Please try again later."})
+            return
+        
+        post_contents = ["".join(chunks) for chunks in parts if chunks]
+        if not post_contents:
+            yield _sse_event("error", {"detail": "I couldn't generate a LinkedIn post at this time. Please try again."})
+            return
+        
+        post_ids = saved["post_ids"]
+        generated_posts = [
+            GeneratedPost(post_id=post_id, content=post_content).model_dump()
+            for post_id, post_content in zip(post_ids, post_contents)
+        ]
+        yield _sse_event("done", {"posts": generated_posts})
     
-    return PostResponse(
-        posts=generated_posts,
-        user_type=user_type,
-        similar_posts=similar_posts_text if similar_posts_text else None
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @router.post("/save_choice", response_model=bool)
-def save_choice(choice: PostChoice, db: Session = Depends(get_db)):
-    success = crud.save_post_choice(db, choice.post_id)
+async def save_choice(choice: PostChoice, db: AsyncSession = Depends(get_async_db)):
+    success = await crud.asave_post_choice(db, choice.post_id)
     if not success:
         raise HTTPException(status_code=404, detail="Post not found")
     return True
 
 @router.get("/clients/{user_id}", response_model=ClientResponse)
-def get_clients(user_id: str, db: Session = Depends(get_db)):
-    clients = crud.get_clients(db, user_id)
+async def get_clients(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    clients = await crud.aget_clients(db, user_id)
     return ClientResponse(clients=clients)
 
 @router.post("/clients", response_model=ClientResponse)
-def create_client(user_id: str, name: str, industry: str = None, db: Session = Depends(get_db)):
+async def create_client(user_id: str, name: str, industry: str = None, db: AsyncSession = Depends(get_async_db)):
     # Create a new client for a user (especially useful for copywriters)
     # Type hint fix: industry can be None or str
     industry_val: str | None = industry
-    client = crud.create_client(db, user_id, name, industry_val)
-    clients = crud.get_clients(db, user_id)
-    return ClientResponse(clients=clients)
\ No newline at end of file
+    client = await crud.acreate_client(db, user_id, name, industry_val)
+    clients = await crud.aget_clients(db, user_id)
+    return ClientResponse(clients=clients)
+
+@router.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving requests
+    return {"status": "ok"}
+
+@router.get("/readyz")
+def readyz(vector_store_service: VectorStoreService = Depends(get_vector_store_service)):
+    # Readiness: the similar-post index has finished loading
+    if not vector_store_service.is_ready:
+        detail = {"status": "loading"}
+        if vector_store_service.load_error:
+            # The load is retried in the background; attempts shows how long it has been failing
+            detail = {
+                "status": "error",
+                "error": vector_store_service.load_error,
+                "attempts": vector_store_service.load_attempts,
+            }
+        return JSONResponse(status_code=503, content=detail)
+    return {"status": "ready"}
+
+@router.get("/metrics")
+def metrics():
+    # Prometheus scrape endpoint: stage and request latency histograms plus token counters, by user tier
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -13,6 +13,61 @@ class Settings(BaseSettings):
     FRAMEWORKS_CSV_PATH: str = "app/db/frameworks.csv"
     CTA_CSV_PATH: str = "app/db/cta.csv"
     FAISS_INDEX_PATH: str = "data/faiss_index"
+    FAISS_INDEX_TYPE: str = "flat"  # flat | hnsw | ivf_flat | ivf_pq
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 200
+    FAISS_HNSW_EF_SEARCH: int = 64
+    FAISS_IVF_NLIST: int = 1024
+    FAISS_IVF_NPROBE: int = 16
+    FAISS_PQ_M: int = 16
+    FAISS_PQ_NBITS: int = 8
+    INDEX_LOAD_RETRY_SECONDS: float = 5.0  # first retry of a failed background load; 0 disables retries
+    INDEX_LOAD_RETRY_MAX_SECONDS: float = 300.0
+    LLM_MAX_CONCURRENT_GENERATIONS: int = 8
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 2048
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_MAX_WORKERS: int = 4
+    EMBEDDING_MAX_RETRIES: int = 6
+    INGEST_CHUNK_SIZE: int = 5000
+    INGEST_BATCH_ROWS: int = 10000
+    RETRIEVAL_MMR_ENABLED: bool = True
+    RETRIEVAL_FETCH_K: int = 20  # candidates pulled from the index before re-ranking
+    RETRIEVAL_MMR_LAMBDA: float = 0.5  # 1.0 = pure relevance, lower = more diverse
+    RETRIEVAL_MAX_PER_AUTHOR: int = 1  # 0 disables the per-profile cap
+    RETRIEVAL_HYBRID_ENABLED: bool = True  # fuse BM25 with vector hits
+    RETRIEVAL_RRF_K: int = 60
+    RETRIEVAL_EMBEDDING_DEADLINE_SECONDS: float = 1.5  # lexical-only past this; 0 waits indefinitely
+    RETRIEVAL_EMBEDDING_WORKERS: int = 8  # never fewer than LLM_MAX_CONCURRENT_GENERATIONS
+    RETRIEVAL_EXACT_SCAN_MAX_ROWS: int = 5000  # larger filtered subsets are searched through the index with a selector
+    INGEST_DEDUP_ENABLED: bool = True
+    INGEST_DEDUP_MAX_DISTANCE: int = 3  # SimHash bits that may differ between near-duplicates
+    INGEST_MIN_CHARS: int = 40
+    INGEST_MIN_WORDS: int = 6
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_TIERS: str = "copywriter,pro,normal,beginner"
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    CLIENT_STATE_MAX_CLIENTS: int = 10000
+    CLIENT_STATE_TTL_SECONDS: int = 7 * 24 * 3600
+    CLIENT_STATE_MAX_BYTES: int = 64 * 1024 * 1024
+    CLIENT_HISTORY_LIMIT: int = 20
+    CLIENT_STATE_BACKEND: str = "memory"
+    CLIENT_STATE_FLUSH_INTERVAL_SECONDS: float = 1.0
+    CLIENT_STATE_REFRESH_SECONDS: float = 2.0  # re-read the last hook/framework/CTA/topic (one row)
+    CLIENT_HISTORY_REFRESH_SECONDS: float = 300.0  # re-read the full history
+    PROMPT_TOKEN_BUDGET: int = 3000
+    PROMPT_MAX_ITEM_TOKENS: int = 400
+    PROMPT_TOKENIZER_ENCODING: str = "cl100k_base"
+    DATABASE_URL: str = "sqlite:///./linkedin_posts.db"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # NORMAL is durable across app crashes in WAL mode
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,111 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (0, 50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+REQUEST_SECONDS = Histogram(
+    "linkedin_request_duration_seconds",
+    "End-to-end latency of post generation requests",
+    ["endpoint", "tier"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "linkedin_stage_duration_seconds",
+    "Time spent in each stage of post generation",
+    ["stage", "tier"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "linkedin_llm_tokens",
+    "Tokens reported in completion usage (kind is prompt, completion or cached_prompt)",
+    ["kind", "tier"],
+)
+LLM_COMPLETIONS = Counter(
+    "linkedin_llm_completions",
+    "Generation attempts by outcome (completed, cache_hit or error)",
+    ["outcome", "tier"],
+)
+PROMPT_TOKENS = Histogram(
+    "linkedin_prompt_tokens",
+    "Prompt tokens per section after budgeting (section is required, examples, history or total)",
+    ["section", "tier"],
+    buckets=TOKEN_BUCKETS,
+)
+PROMPT_DROPPED_ITEMS = Counter(
+    "linkedin_prompt_dropped_items",
+    "History and example items left out of the prompt to stay within the token budget",
+    ["tier"],
+)
+
+UNKNOWN_TIER = "unknown"
+
+
+class StageTimer:
+    """Collect per-stage durations for one request and export them once it finishes.
+
+    Stages are timed with ``stage(name)``; ``tier`` can be set after the user
+    has been looked up because labels are only applied in ``finish``.
+    """
+
+    def __init__(self, endpoint: str = "llm", tier: Optional[str] = None):
+        self.endpoint = endpoint
+        self.tier = tier or UNKNOWN_TIER
+        self.spans: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.0) + time.perf_counter() - started
+
+    def finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        for name, seconds in self.spans.items():
+            STAGE_SECONDS.labels(stage=name, tier=self.tier).observe(seconds)
+        REQUEST_SECONDS.labels(endpoint=self.endpoint, tier=self.tier).observe(time.perf_counter() - self._started)
+
+    def server_timing(self) -> str:
+        """Render the spans as a ``Server-Timing`` header value (milliseconds)."""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items())
+
+
+def record_token_usage(usage, tier: Optional[str] = None) -> None:
+    """Add a completion ``usage`` block to the token counters."""
+    if usage is None:
+        return
+    tier = tier or UNKNOWN_TIER
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached_tokens = details.get("cached_tokens") or 0
+    else:
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+    LLM_TOKENS.labels(kind="prompt", tier=tier).inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(kind="completion", tier=tier).inc(getattr(usage, "completion_tokens", 0) or 0)
+    LLM_TOKENS.labels(kind="cached_prompt", tier=tier).inc(cached_tokens)
+
+
+def record_prompt_tokens(report: Dict[str, int], tier: Optional[str] = None) -> None:
+    """Export a ``PromptBudgeter.fit`` token report."""
+    if not report:
+        return
+    tier = tier or UNKNOWN_TIER
+    for section, tokens in report.items():
+        if section == "dropped_items":
+            PROMPT_DROPPED_ITEMS.labels(tier=tier).inc(tokens)
+        else:
+            PROMPT_TOKENS.labels(section=section, tier=tier).observe(tokens)
+
+
+def render_metrics():
+    """Return the Prometheus text exposition and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,3 +1,6 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from . import models
 from ..models.schemas import UserType, Client as ClientSchema
@@ -32,20 +35,33 @@ def create_client(db: Session, user_id: str, name: str, industry=None):
     db.refresh(db_client)
     return db_client
 
-def save_post(db: Session, user_id: str, query: str, content: str, client_id=None):
-    post_id = str(uuid.uuid4())
-    db_post = models.Post(
-        post_id=post_id,
-        user_id=user_id,
-        client_id=client_id,
-        query=query,
-        content=content
+def save_posts(db: Session, user_id: str, query: str, contents, client_id=None):
+    # Insert every draft of a request in one transaction; the counter is bumped in SQL so concurrent requests can't lose updates
+    contents = list(contents)
+    if not contents:
+        return []
+    post_ids = [str(uuid.uuid4()) for _ in contents]
+    db.add_all([
+        models.Post(
+            post_id=post_id,
+            user_id=user_id,
+            client_id=client_id,
+            query=query,
+            content=content
+        )
+        for post_id, content in zip(post_ids, contents)
+    ])
+    db.execute(
+        update(models.User)
+        .where(models.User.user_id == user_id)
+        .values(post_count=func.coalesce(models.User.post_count, 0) + len(contents))
+        .execution_options(synchronize_session=False)
     )
-    db.add(db_post)
-    user = get_user(db, user_id)
-    user.post_count += 1
     db.commit()
-    return post_id
+    return post_ids
+
+def save_post(db: Session, user_id: str, query: str, content: str, client_id=None):
+    return save_posts(db, user_id, query, [content], client_id)[0]
 
 def save_post_choice(db: Session, post_id: str):
     db_post = db.query(models.Post).filter(models.Post.post_id == post_id).first()
@@ -53,4 +69,129 @@ def save_post_choice(db: Session, post_id: str):
         db_post.chosen = True
         db.commit()
         return True
-    return False
\ No newline at end of file
+    return False
+
+# Async counterparts used by the API routes; they run on the event loop via an AsyncSession
+
+async def aget_user(db: AsyncSession, user_id: str):
+    return await db.get(models.User, user_id)
+
+async def acreate_user(db: AsyncSession, user_id: str, user_type: UserType = UserType.BEGINNER):
+    db_user = models.User(user_id=user_id, user_type=user_type, post_count=0)
+    db.add(db_user)
+    await db.commit()
+    return db_user
+
+async def aget_or_create_user(db: AsyncSession, user_id: str):
+    user = await aget_user(db, user_id)
+    if user:
+        return user
+    try:
+        return await acreate_user(db, user_id)
+    except IntegrityError:
+        # A concurrent request created the same user first
+        await db.rollback()
+        return await aget_user(db, user_id)
+
+async def aget_clients(db: AsyncSession, user_id: str):
+    result = await db.execute(select(models.Client).where(models.Client.user_id == user_id))
+    return [ClientSchema(client_id=c.client_id, name=c.name, industry=c.industry, created_at=c.created_at)
+            for c in result.scalars().all()]
+
+async def acreate_client(db: AsyncSession, user_id: str, name: str, industry=None):
+    db_client = models.Client(client_id=str(uuid.uuid4()), user_id=user_id, name=name, industry=industry)
+    db.add(db_client)
+    await db.commit()
+    return db_client
+
+async def asave_posts(db: AsyncSession, user_id: str, query: str, contents, client_id=None):
+    contents = list(contents)
+    if not contents:
+        return []
+    post_ids = [str(uuid.uuid4()) for _ in contents]
+    db.add_all([
+        models.Post(
+            post_id=post_id,
+            user_id=user_id,
+            client_id=client_id,
+            query=query,
+            content=content
+        )
+        for post_id, content in zip(post_ids, contents)
+    ])
+    await db.execute(
+        update(models.User)
+        .where(models.User.user_id == user_id)
+        .values(post_count=func.coalesce(models.User.post_count, 0) + len(contents))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return post_ids
+
+async def asave_post(db: AsyncSession, user_id: str, query: str, content: str, client_id=None):
+    return (await asave_posts(db, user_id, query, [content], client_id))[0]
+
+async def asave_post_choice(db: AsyncSession, post_id: str):
+    db_post = await db.get(models.Post, post_id)
+    if db_post:
+        db_post.chosen = True
+        await db.commit()
+        return True
+    return False
+
+def load_client_state(db: Session, client_id: str, history_limit: int):
+    db_state = db.query(models.ClientState).filter(models.ClientState.client_id == client_id).first()
+    if db_state is None:
+        return None
+    db_interactions = (
+        db.query(models.ClientInteraction)
+        .filter(models.ClientInteraction.client_id == client_id)
+        .order_by(models.ClientInteraction.id.desc())
+        .limit(history_limit)
+        .all()
+    )
+    return db_state, list(reversed(db_interactions))
+
+def load_client_last(db: Session, client_id: str):
+    return db.get(models.ClientState, client_id)
+
+def save_client_states(db: Session, snapshots, history_limit: int):
+    for snapshot in snapshots:
+        client_id = snapshot["client_id"]
+        db_state = db.get(models.ClientState, client_id)
+        if db_state is None:
+            db_state = models.ClientState(client_id=client_id)
+            db.add(db_state)
+        db_state.last_hook = snapshot["hook"]
+        db_state.last_framework = snapshot["framework"]
+        db_state.last_cta = snapshot["cta"]
+        db_state.last_topic = snapshot["topic"]
+        db.flush()
+
+        for record in snapshot["records"]:
+            db.add(models.ClientInteraction(
+                client_id=client_id,
+                timestamp=record.timestamp,
+                query=record.query,
+                topic=record.topic,
+                hook=record.hook,
+                framework=record.framework,
+                cta=record.cta,
+                response=record.response
+            ))
+        db.flush()
+
+        if snapshot["records"]:
+            # Keep only the newest history_limit interactions per client
+            keep_ids = (
+                db.query(models.ClientInteraction.id)
+                .filter(models.ClientInteraction.client_id == client_id)
+                .order_by(models.ClientInteraction.id.desc())
+                .limit(history_limit)
+                .scalar_subquery()
+            )
+            db.query(models.ClientInteraction).filter(
+                models.ClientInteraction.client_id == client_id,
+                models.ClientInteraction.id.not_in(keep_ids)
+            ).delete(synchronize_session=False)
+    db.commit()
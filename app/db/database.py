@@ -1,15 +1,133 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./linkedin_posts.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+from ..core.config import settings
+
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+# Async drivers for the sync URLs this app is configured with
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """Translate a sync database URL into its async-driver equivalent."""
+    scheme, separator, rest = url.partition("://")
+    if "+" in scheme and scheme.split("+", 1)[1] in ("aiosqlite", "asyncpg"):
+        return url
+    base_scheme = scheme.split("+", 1)[0]
+    if base_scheme not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database URL scheme {scheme!r}")
+    return f"{ASYNC_DRIVERS[base_scheme]}{separator}{rest}"
+
+
+def _register_sqlite_pragmas(sync_engine: Engine, journal_mode: str, synchronous: str, busy_timeout_ms: int):
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if journal_mode:
+                cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            if synchronous:
+                cursor.execute(f"PRAGMA synchronous={synchronous}")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        finally:
+            cursor.close()
+
+
+def create_db_engine(
+    url: str = SQLALCHEMY_DATABASE_URL,
+    pool_size: int = settings.DB_POOL_SIZE,
+    max_overflow: int = settings.DB_MAX_OVERFLOW,
+    pool_timeout: float = settings.DB_POOL_TIMEOUT_SECONDS,
+    journal_mode: str = settings.SQLITE_JOURNAL_MODE,
+    synchronous: str = settings.SQLITE_SYNCHRONOUS,
+    busy_timeout_ms: int = settings.SQLITE_BUSY_TIMEOUT_MS,
+) -> Engine:
+    """Create an engine with a thread-safe connection pool and, for SQLite, per-connection pragmas.
+
+    WAL lets readers proceed while a write is in progress, and the busy
+    timeout makes concurrent writers wait for the lock instead of failing
+    with "database is locked".
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+
+    db_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": busy_timeout_ms / 1000},
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+    )
+
+    _register_sqlite_pragmas(db_engine, journal_mode, synchronous, busy_timeout_ms)
+    return db_engine
+
+
+def create_async_db_engine(
+    url: str = SQLALCHEMY_DATABASE_URL,
+    pool_size: int = settings.DB_POOL_SIZE,
+    max_overflow: int = settings.DB_MAX_OVERFLOW,
+    pool_timeout: float = settings.DB_POOL_TIMEOUT_SECONDS,
+    journal_mode: str = settings.SQLITE_JOURNAL_MODE,
+    synchronous: str = settings.SQLITE_SYNCHRONOUS,
+    busy_timeout_ms: int = settings.SQLITE_BUSY_TIMEOUT_MS,
+) -> AsyncEngine:
+    """Async counterpart of ``create_db_engine`` over the same database (aiosqlite for SQLite files).
+
+    The pool class is explicit because aiosqlite defaults to NullPool, which
+    rejects the pool sizing arguments.
+    """
+    url = async_database_url(url)
+    if not url.startswith("sqlite"):
+        return create_async_engine(
+            url,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+        )
+
+    db_engine = create_async_engine(
+        url,
+        connect_args={"timeout": busy_timeout_ms / 1000},
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+    )
+    _register_sqlite_pragmas(db_engine.sync_engine, journal_mode, synchronous, busy_timeout_ms)
+    return db_engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_db_engine()
+# Keep attributes loaded after commit; an expired attribute can't lazily refresh outside an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+
+def create_missing_indexes(bind: Engine = engine):
+    # create_all only builds indexes along with new tables, so add ones declared after a table already existed
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
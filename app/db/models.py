@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, Enum, Boolean
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, Enum, Boolean, Float
 from sqlalchemy.orm import relationship
 import datetime
 import uuid
@@ -18,7 +18,7 @@ class User(Base):
 class Client(Base):
     __tablename__ = "clients"
     client_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.user_id"))
+    user_id = Column(String, ForeignKey("users.user_id"), index=True)
     name = Column(String, nullable=False)
     industry = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.now)
@@ -28,11 +28,33 @@ class Client(Base):
 class Post(Base):
     __tablename__ = "posts"
     post_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.user_id"))
-    client_id = Column(String, ForeignKey("clients.client_id"), nullable=True)
+    user_id = Column(String, ForeignKey("users.user_id"), index=True)
+    client_id = Column(String, ForeignKey("clients.client_id"), nullable=True, index=True)
     query = Column(Text, nullable=False)
     content = Column(Text, nullable=False)
     chosen = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.now)
     user = relationship("User", back_populates="posts")
-    client = relationship("Client", back_populates="posts")
\ No newline at end of file
+    client = relationship("Client", back_populates="posts")
+
+class ClientState(Base):
+    __tablename__ = "client_states"
+    client_id = Column(String, primary_key=True)
+    last_hook = Column(Text, nullable=True)
+    last_framework = Column(Text, nullable=True)
+    last_cta = Column(Text, nullable=True)
+    last_topic = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
+class ClientInteraction(Base):
+    __tablename__ = "client_interactions"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    client_id = Column(String, ForeignKey("client_states.client_id"), index=True, nullable=False)
+    timestamp = Column(Float, nullable=False)
+    query = Column(Text, nullable=False)
+    topic = Column(Text, nullable=True)
+    hook = Column(Text, nullable=True)
+    framework = Column(Text, nullable=True)
+    cta = Column(Text, nullable=True)
+    response = Column(Text, nullable=False)
+
@@ -1,9 +1,10 @@
 # setup_db.py
-from app.db.database import engine
+from app.db.database import create_missing_indexes, engine
 from app.db import models
 
 def setup_database():
     models.Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
     print("Database tables created successfully!")
 
 if __name__ == "__main__":
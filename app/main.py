@@ -1,15 +1,28 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+from app.api.dependencies import init_services
 from app.api.routes import router
 from app.db import models
-from app.db.database import engine
+from app.db.database import async_engine, create_missing_indexes, engine
 
 # Create tables if they don't exist
 models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="LinkedIn Post Generator API")
+create_missing_indexes()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the services without loading the index; it warms up in the background so the port binds immediately
+    llm_service = init_services(app)
+    yield
+    # Persist any client state still waiting in the write-behind cache
+    llm_service.client_state.close()
+    await async_engine.dispose()
+
+app = FastAPI(title="LinkedIn Post Generator API", lifespan=lifespan)
 
 # Add CORS middleware to allow frontend to call API
 app.add_middleware(
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from enum import Enum
-from datetime import datetime
+from datetime import date, datetime
 
 class UserType(str, Enum):
     COPYWRITER = "copywriter"
@@ -15,10 +15,18 @@ class Client(BaseModel):
     industry: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)
 
+class ExampleFilter(BaseModel):
+    profile_name: Optional[str] = None
+    profile_url: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
 class PostRequest(BaseModel):
     user_id: str
     query: str
     client_id: Optional[str] = None
+    # Restrict the example posts, e.g. to write "in the style of" one author
+    example_filter: Optional[ExampleFilter] = None
 
 class PostChoice(BaseModel):
     user_id: str
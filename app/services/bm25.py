@@ -0,0 +1,118 @@
+import json
+import math
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .dedup import normalize_tokens
+from .staging import commit_staged, stage_files
+
+BM25_VOCAB_FILE = "bm25_vocab.json"
+BM25_OFFSETS_FILE = "bm25_offsets.npy"
+BM25_DOCS_FILE = "bm25_docs.npy"
+BM25_TF_FILE = "bm25_tf.npy"
+BM25_LENGTHS_FILE = "bm25_lengths.npy"
+
+BM25_FILES = (BM25_VOCAB_FILE, BM25_OFFSETS_FILE, BM25_DOCS_FILE, BM25_TF_FILE, BM25_LENGTHS_FILE)
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its me my of on or our so that the their this to "
+    "was we were what when with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in normalize_tokens(text) if token not in STOPWORDS]
+
+
+def bm25_index_exists(directory: Path) -> bool:
+    return all((directory / name).exists() for name in BM25_FILES)
+
+
+def write_bm25_index(directory: Path, texts: Iterable[str]) -> int:
+    """Write a compressed-row inverted index over ``texts`` in index order.
+
+    Postings for each term are a contiguous slice of the docs/tf arrays,
+    located through ``bm25_offsets.npy``; the vocabulary is stored as a JSON
+    list whose order gives the term ids. Returns the number of documents.
+    """
+    vocab = {}
+    term_ids = array("i")
+    doc_ids = array("i")
+    term_freqs = array("i")
+    lengths = array("i")
+    for position, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(position)
+            term_freqs.append(tf)
+
+    terms = np.frombuffer(term_ids, dtype=np.int32) if term_ids else np.empty(0, dtype=np.int32)
+    docs = np.frombuffer(doc_ids, dtype=np.int32) if doc_ids else np.empty(0, dtype=np.int32)
+    tfs = np.frombuffer(term_freqs, dtype=np.int32) if term_freqs else np.empty(0, dtype=np.int32)
+    # Group postings by term; documents stay in position order within a term
+    order = np.argsort(terms, kind="stable")
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+
+    arrays = {
+        BM25_OFFSETS_FILE: offsets,
+        BM25_DOCS_FILE: docs[order],
+        BM25_TF_FILE: tfs[order],
+        BM25_LENGTHS_FILE: np.frombuffer(lengths, dtype=np.int32) if lengths else np.empty(0, dtype=np.int32),
+    }
+    stage_files(directory, arrays, {BM25_VOCAB_FILE: sorted(vocab, key=vocab.get)})
+    commit_staged(directory, BM25_FILES)
+    return len(lengths)
+
+
+class BM25Index:
+    """Okapi BM25 search over the on-disk inverted index; postings are memory-mapped."""
+
+    def __init__(self, directory: Path, k1: float = 1.5, b: float = 0.75):
+        self.directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+        terms = json.loads((self.directory / BM25_VOCAB_FILE).read_text(encoding="utf-8"))
+        self._vocab = {term: term_id for term_id, term in enumerate(terms)}
+        self._offsets = np.load(self.directory / BM25_OFFSETS_FILE)
+        self._docs = np.load(self.directory / BM25_DOCS_FILE, mmap_mode="r")
+        self._tf = np.load(self.directory / BM25_TF_FILE, mmap_mode="r")
+        self._lengths = np.load(self.directory / BM25_LENGTHS_FILE).astype(np.float32)
+        self._avg_length = float(self._lengths.mean()) if len(self._lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def search(self, query: str, k: int, candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(position, score)`` pairs, best first, optionally within ``candidates``."""
+        count = len(self._lengths)
+        term_ids = {self._vocab[term] for term in tokenize(query) if term in self._vocab}
+        if not count or not term_ids or k <= 0:
+            return []
+
+        scores = np.zeros(count, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self._lengths / max(self._avg_length, 1e-9))
+        for term_id in term_ids:
+            start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+            docs = np.asarray(self._docs[start:end])
+            tf = np.asarray(self._tf[start:end], dtype=np.float32)
+            df = end - start
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            # A term's postings hold each document once, so fancy-index accumulation is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        if candidates is not None:
+            mask = np.zeros(count, dtype=bool)
+            mask[candidates] = True
+            scores[~mask] = 0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(position), float(scores[position])) for position in matched]
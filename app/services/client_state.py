@@ -0,0 +1,471 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..db import crud
+
+_LAST_FIELDS = ("hook", "framework", "cta", "topic")
+
+
+class InteractionRecord:
+    """One generated post in a client's history."""
+
+    __slots__ = ("timestamp", "query", "topic", "hook", "framework", "cta", "response")
+
+    def __init__(
+        self,
+        query: str,
+        topic: str,
+        hook: str,
+        framework: str,
+        cta: str,
+        response: str,
+        timestamp: Optional[float] = None,
+    ):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.query = query
+        self.topic = topic
+        self.hook = hook
+        self.framework = framework
+        self.cta = cta
+        self.response = response
+
+    def size_bytes(self) -> int:
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(getattr(self, name) or "") for name in self.__slots__ if name != "timestamp"
+        )
+
+
+class ClientState:
+    """History and last selections for a single client."""
+
+    __slots__ = (
+        "history",
+        "hook",
+        "framework",
+        "cta",
+        "topic",
+        "last_seen",
+        "loaded_at",
+        "history_loaded_at",
+        "size",
+        "pending",
+        "dirty",
+    )
+
+    def __init__(self):
+        self.history: List[InteractionRecord] = []
+        self.hook: Optional[str] = None
+        self.framework: Optional[str] = None
+        self.cta: Optional[str] = None
+        self.topic: Optional[str] = None
+        self.last_seen = time.time()
+        # When the last selections, and the whole state, were last read from the backend
+        self.loaded_at = self.last_seen
+        self.history_loaded_at = self.last_seen
+        self.size = 0
+        # Interactions not yet written to the backend
+        self.pending: List[InteractionRecord] = []
+        self.dirty = False
+
+    def snapshot(self, client_id: str) -> Dict:
+        return {
+            "client_id": client_id,
+            "hook": self.hook,
+            "framework": self.framework,
+            "cta": self.cta,
+            "topic": self.topic,
+            "records": list(self.pending),
+        }
+
+    def measure(self) -> int:
+        self.size = (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.history)
+            + sum(record.size_bytes() for record in self.history)
+            + sum(sys.getsizeof(getattr(self, name) or "") for name in _LAST_FIELDS)
+        )
+        return self.size
+
+
+class ClientStateBackend:
+    """Persistence hook for ``ClientStateStore``; the default keeps nothing."""
+
+    def load(self, client_id: str, history_limit: int) -> Optional[ClientState]:
+        return None
+
+    def load_last(self, client_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """Only the last hook, framework, CTA and topic; backends should override this with a cheaper read."""
+        state = self.load(client_id, 1)
+        if state is None:
+            return None
+        return {field: getattr(state, field) for field in _LAST_FIELDS}
+
+    def save(self, snapshots: List[Dict]) -> None:
+        pass
+
+
+class DatabaseClientStateBackend(ClientStateBackend):
+    """Persist client state in the application database so every worker shares it."""
+
+    def __init__(self, session_factory, history_limit: int = 20):
+        self.session_factory = session_factory
+        self.history_limit = history_limit
+
+    def load(self, client_id: str, history_limit: int) -> Optional[ClientState]:
+        db = self.session_factory()
+        try:
+            loaded = crud.load_client_state(db, client_id, history_limit)
+        finally:
+            db.close()
+        if loaded is None:
+            return None
+
+        db_state, db_interactions = loaded
+        state = ClientState()
+        state.hook = db_state.last_hook
+        state.framework = db_state.last_framework
+        state.cta = db_state.last_cta
+        state.topic = db_state.last_topic
+        state.history = [
+            InteractionRecord(
+                query=row.query,
+                topic=row.topic,
+                hook=row.hook,
+                framework=row.framework,
+                cta=row.cta,
+                response=row.response,
+                timestamp=row.timestamp,
+            )
+            for row in db_interactions
+        ]
+        return state
+
+    def load_last(self, client_id: str) -> Optional[Dict[str, Optional[str]]]:
+        db = self.session_factory()
+        try:
+            db_state = crud.load_client_last(db, client_id)
+        finally:
+            db.close()
+        if db_state is None:
+            return None
+        return {
+            "hook": db_state.last_hook,
+            "framework": db_state.last_framework,
+            "cta": db_state.last_cta,
+            "topic": db_state.last_topic,
+        }
+
+    def save(self, snapshots: List[Dict]) -> None:
+        db = self.session_factory()
+        try:
+            crud.save_client_states(db, snapshots, self.history_limit)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+class ClientStateStore:
+    """Bounded in-process store of per-client conversation state.
+
+    Clients are kept in least-recently-used order and evicted when they have
+    been idle for ``ttl_seconds``, when more than ``max_clients`` are
+    resident, or when the estimated footprint exceeds ``max_bytes``. Each
+    client keeps at most ``history_limit`` interactions.
+
+    With a ``backend`` the store acts as a write-behind cache: reads load a
+    client from the backend when it is missing or its history is older than
+    ``history_refresh_seconds``. Otherwise only the last hook, framework, CTA
+    and topic are re-read once older than ``refresh_seconds``, since those
+    must agree across workers. Changes are flushed every ``flush_interval``
+    seconds by a background thread (and on ``close``). Backend calls never
+    run under the store lock, so a slow database only stalls the caller
+    that needs it; they still block, so async callers should use a thread.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = 10000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+        history_limit: int = 20,
+        backend: Optional[ClientStateBackend] = None,
+        flush_interval: float = 1.0,
+        refresh_seconds: float = 2.0,
+        history_refresh_seconds: float = 300.0,
+    ):
+        self.max_clients = max(1, max_clients)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max(0, max_bytes)
+        self.history_limit = max(1, history_limit)
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.refresh_seconds = refresh_seconds
+        self.history_refresh_seconds = history_refresh_seconds
+        self._clients: "OrderedDict[str, ClientState]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        # Dirty clients evicted under the lock, written through by the caller once it is released
+        self._evicted: List[Dict] = []
+        # One backend load per client at a time; other callers wait for it
+        self._loading: Dict[str, threading.Event] = {}
+        self._total_bytes = 0
+        self._evictions = 0
+        self._flushes = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if self.backend is not None and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="client-state-flush", daemon=True)
+            self._flusher.start()
+
+    def _expired(self, state: ClientState, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - state.last_seen > self.ttl_seconds
+
+    def _remove(self, client_id: str) -> None:
+        state = self._clients.pop(client_id, None)
+        if state is None:
+            return
+        self._total_bytes -= state.size
+        self._evictions += 1
+        if client_id in self._dirty:
+            # Never drop unsaved changes: queue the evicted client for an immediate write-through
+            self._dirty.discard(client_id)
+            self._evicted.append(state.snapshot(client_id))
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        # Clients are ordered by last use, so idle and over-budget clients sit at the front
+        now = time.time()
+        while self._clients:
+            oldest = next(iter(self._clients))
+            if oldest == keep:
+                break
+            over_budget = len(self._clients) > self.max_clients or (
+                self.max_bytes and self._total_bytes > self.max_bytes
+            )
+            if not over_budget and not self._expired(self._clients[oldest], now):
+                break
+            self._remove(oldest)
+
+    def _needs_load(self, state: Optional[ClientState], now: float) -> Optional[str]:
+        """``"full"``, ``"last"`` (selections only) or ``None`` when the cached copy is current enough."""
+        if state is None:
+            return "full"
+        if state.dirty:
+            return None
+        # A clean client may have been moved on by another worker
+        if now - state.history_loaded_at > self.history_refresh_seconds:
+            return "full"
+        if now - state.loaded_at > self.refresh_seconds:
+            return "last"
+        return None
+
+    def _refresh(self, client_id: str) -> None:
+        """Load ``client_id`` from the backend when needed, without holding the lock during the load."""
+        if self.backend is None:
+            return
+        while True:
+            with self._lock:
+                state = self._clients.get(client_id)
+                now = time.time()
+                if state is not None and self._expired(state, now):
+                    self._remove(client_id)
+                    state = None
+                kind = self._needs_load(state, now)
+                if kind is None:
+                    return
+                loading = self._loading.get(client_id)
+                if loading is None:
+                    loading = self._loading[client_id] = threading.Event()
+                    break
+            # Another caller is already loading this client; use its result
+            loading.wait()
+
+        # Changes evicted for this client must reach the backend before it is read back
+        self._write_evicted()
+        loaded, failed = None, False
+        try:
+            if kind == "last":
+                loaded = self.backend.load_last(client_id)
+            else:
+                loaded = self.backend.load(client_id, self.history_limit)
+        except Exception as exc:
+            print(f"Failed to load client state for {client_id}: {exc}")
+            failed = True
+        finally:
+            with self._lock:
+                current = self._clients.get(client_id)
+                if current is not None and (current.dirty or failed):
+                    # Local changes win; a failed load keeps serving the cached copy for another interval
+                    current.loaded_at = time.time()
+                elif kind == "last":
+                    # An evicted client is fully loaded on its next use instead
+                    if current is not None:
+                        if loaded is not None:
+                            for field in _LAST_FIELDS:
+                                setattr(current, field, loaded[field])
+                            previous = current.size
+                            self._total_bytes += current.measure() - previous
+                        current.loaded_at = time.time()
+                elif not failed:
+                    if current is not None:
+                        self._total_bytes -= current.size
+                    # Clients the backend doesn't know are cached empty so they aren't reloaded on every call
+                    state = loaded or ClientState()
+                    state.loaded_at = state.history_loaded_at = state.last_seen = time.time()
+                    self._clients[client_id] = state
+                    self._total_bytes += state.measure()
+                    self._evict(keep=client_id)
+                self._loading.pop(client_id).set()
+        self._write_evicted()
+
+    def _touch(self, client_id: str, create: bool) -> Optional[ClientState]:
+        state = self._clients.get(client_id)
+        now = time.time()
+        if state is not None and self._expired(state, now):
+            self._remove(client_id)
+            state = None
+        if state is None:
+            if not create:
+                return None
+            state = ClientState()
+            self._clients[client_id] = state
+            self._total_bytes += state.measure()
+        state.last_seen = now
+        self._clients.move_to_end(client_id)
+        return state
+
+    def _remeasure(self, client_id: str, state: ClientState) -> None:
+        previous = state.size
+        self._total_bytes += state.measure() - previous
+        if self.backend is not None:
+            state.dirty = True
+            self._dirty.add(client_id)
+        self._evict(keep=client_id)
+
+    def history(self, client_id: str) -> List[InteractionRecord]:
+        self._refresh(client_id)
+        with self._lock:
+            state = self._touch(client_id, create=False)
+            history = list(state.history) if state is not None else []
+        self._write_evicted()
+        return history
+
+    def get_last(self, client_id: str, field: str) -> Optional[str]:
+        self._refresh(client_id)
+        with self._lock:
+            state = self._touch(client_id, create=False)
+            value = getattr(state, field) if state is not None else None
+        self._write_evicted()
+        return value
+
+    def set_last(self, client_id: str, field: str, value: str) -> None:
+        self.update_last(client_id, field, lambda previous: value)
+
+    def update_last(
+        self, client_id: str, field: str, choose: Callable[[Optional[str]], Optional[str]]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Replace ``field`` with ``choose(previous)`` in one step; returns ``(previous, chosen)``.
+
+        An empty choice leaves the field unchanged.
+        """
+        if field not in _LAST_FIELDS:
+            raise ValueError(f"Unknown client state field: {field}")
+        self._refresh(client_id)
+        with self._lock:
+            state = self._touch(client_id, create=True)
+            previous = getattr(state, field)
+            chosen = choose(previous)
+            if chosen:
+                setattr(state, field, chosen)
+                self._remeasure(client_id, state)
+        self._write_evicted()
+        return previous, chosen
+
+    def append(self, client_id: str, record: InteractionRecord) -> None:
+        self._refresh(client_id)
+        with self._lock:
+            state = self._touch(client_id, create=True)
+            state.history.append(record)
+            if len(state.history) > self.history_limit:
+                del state.history[: len(state.history) - self.history_limit]
+            if self.backend is not None:
+                state.pending.append(record)
+            for field in _LAST_FIELDS:
+                value = getattr(record, field)
+                if value:
+                    setattr(state, field, value)
+            self._remeasure(client_id, state)
+        self._write_evicted()
+
+    def _save(self, snapshots: List[Dict]) -> bool:
+        if self.backend is None or not snapshots:
+            return True
+        try:
+            self.backend.save(snapshots)
+            self._flushes += 1
+            return True
+        except Exception as exc:
+            print(f"Failed to persist client state: {exc}")
+            return False
+
+    def _write_evicted(self) -> None:
+        if not self._evicted:
+            return
+        with self._lock:
+            snapshots, self._evicted = self._evicted, []
+        if snapshots and not self._save(snapshots):
+            # Keep them for the next flush to retry
+            with self._lock:
+                self._evicted = snapshots + self._evicted
+
+    def flush(self) -> None:
+        """Write every dirty client (and any evicted changes) to the backend."""
+        self._write_evicted()
+        with self._lock:
+            snapshots = []
+            for client_id in self._dirty:
+                state = self._clients.get(client_id)
+                if state is None:
+                    continue
+                snapshots.append(state.snapshot(client_id))
+                state.pending = []
+                state.dirty = False
+                state.loaded_at = time.time()
+            self._dirty.clear()
+
+        if snapshots and not self._save(snapshots):
+            # Put unsaved interactions back so the next flush retries them
+            with self._lock:
+                for snapshot in snapshots:
+                    state = self._clients.get(snapshot["client_id"])
+                    if state is not None:
+                        state.pending = snapshot["records"] + state.pending
+                        state.dirty = True
+                        self._dirty.add(snapshot["client_id"])
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "bytes": self._total_bytes,
+                "evictions": self._evictions,
+                "dirty_clients": len(self._dirty),
+                "evicted_pending": len(self._evicted),
+                "flushes": self._flushes,
+                "max_clients": self.max_clients,
+                "max_bytes": self.max_bytes,
+            }
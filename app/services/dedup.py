@@ -0,0 +1,96 @@
+import hashlib
+import re
+from typing import Dict, List
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9#@']+")
+_FINGERPRINT_BITS = 64
+
+
+def normalize_tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def simhash(tokens: List[str], shingle_size: int = 3) -> int:
+    """64-bit SimHash of the word shingles in ``tokens``."""
+    if not tokens:
+        return 0
+    if len(tokens) < shingle_size:
+        shingles = tokens
+    else:
+        shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(shingles), _FINGERPRINT_BITS)
+    # Majority vote per bit position
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+class PostFilter:
+    """Drop low-value and near-duplicate posts while streaming an ingest.
+
+    Posts shorter than ``min_chars`` characters or ``min_words`` words are
+    rejected. The rest are fingerprinted with SimHash and compared against
+    the posts already kept; anything within ``max_distance`` bits of an
+    earlier post is a near-duplicate. Fingerprints are split into
+    ``max_distance + 1`` bands and bucketed per band, so any pair within the
+    distance shares at least one bucket and only those candidates are compared.
+    """
+
+    def __init__(self, min_chars: int = 0, min_words: int = 0, max_distance: int = 3, dedup: bool = True):
+        self.min_chars = max(0, min_chars)
+        self.min_words = max(0, min_words)
+        self.max_distance = max(0, min(max_distance, _FINGERPRINT_BITS - 1))
+        self.dedup = dedup
+        bands = self.max_distance + 1
+        self._band_bits = _FINGERPRINT_BITS // bands
+        self._band_count = bands
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self.stats: Dict[str, int] = {"seen": 0, "too_short": 0, "near_duplicates": 0, "kept": 0}
+
+    def _bands(self, fingerprint: int):
+        mask = (1 << self._band_bits) - 1
+        for band in range(self._band_count):
+            # The last band absorbs the remainder bits
+            if band == self._band_count - 1:
+                yield band, fingerprint >> (band * self._band_bits)
+            else:
+                yield band, (fingerprint >> (band * self._band_bits)) & mask
+
+    def _is_near_duplicate(self, fingerprint: int) -> bool:
+        checked = set()
+        for band, key in self._bands(fingerprint):
+            for other in self._buckets[band].get(key, ()):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def accept(self, text: str) -> bool:
+        self.stats["seen"] += 1
+        stripped = text.strip()
+        tokens = normalize_tokens(stripped)
+        if len(stripped) < self.min_chars or len(tokens) < self.min_words:
+            self.stats["too_short"] += 1
+            return False
+        if self.dedup:
+            fingerprint = simhash(tokens)
+            if self._is_near_duplicate(fingerprint):
+                self.stats["near_duplicates"] += 1
+                return False
+            for band, key in self._bands(fingerprint):
+                self._buckets[band].setdefault(key, []).append(fingerprint)
+        self.stats["kept"] += 1
+        return True
+
+    def summary(self) -> str:
+        seen = self.stats["seen"] or 1
+        removed = self.stats["too_short"] + self.stats["near_duplicates"]
+        return (
+            f"{self.stats['kept']} of {self.stats['seen']} posts kept; removed {removed} "
+            f"({removed / seen:.1%}): {self.stats['too_short']} too short, "
+            f"{self.stats['near_duplicates']} near-duplicates"
+        )
@@ -0,0 +1,162 @@
+import json
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from .staging import commit_staged, discard_staged, stage_files, staged_path
+
+TEXT_FILE = "docstore_text.bin"
+TEXT_OFFSETS_FILE = "docstore_text_offsets.npy"
+META_FILE = "docstore_meta.bin"
+META_OFFSETS_FILE = "docstore_meta_offsets.npy"
+IDS_FILE = "docstore_ids.npy"
+
+DOCSTORE_FILES = (TEXT_FILE, TEXT_OFFSETS_FILE, META_FILE, META_OFFSETS_FILE, IDS_FILE)
+
+
+def docstore_exists(directory: Path) -> bool:
+    return all((directory / name).exists() for name in DOCSTORE_FILES)
+
+
+def stage_docstore(directory: Path, rows: Iterable[Tuple[str, Document]]) -> int:
+    """Write documents, in index order, as contiguous UTF-8 text and metadata columns.
+
+    ``rows`` is consumed lazily, so callers can stream documents straight
+    from their source. Files are written beside the live ones and only
+    become visible through ``commit_docstore``, so a caller can stage other
+    files that must change together before swapping any of them in.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    text_offsets = array("q", [0])
+    meta_offsets = array("q", [0])
+    ids: List[bytes] = []
+    with staged_path(directory, TEXT_FILE).open("wb") as text_handle, \
+            staged_path(directory, META_FILE).open("wb") as meta_handle:
+        for doc_id, document in rows:
+            text = document.page_content.encode("utf-8")
+            meta = json.dumps(document.metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            text_handle.write(text)
+            meta_handle.write(meta)
+            text_offsets.append(text_offsets[-1] + len(text))
+            meta_offsets.append(meta_offsets[-1] + len(meta))
+            ids.append(doc_id.encode("ascii"))
+
+    arrays = {
+        TEXT_OFFSETS_FILE: np.frombuffer(text_offsets, dtype=np.int64),
+        META_OFFSETS_FILE: np.frombuffer(meta_offsets, dtype=np.int64),
+        IDS_FILE: np.asarray(ids, dtype="S") if ids else np.empty(0, dtype="S1"),
+    }
+    stage_files(directory, arrays)
+    return len(ids)
+
+
+def commit_docstore(directory: Path) -> None:
+    """Swap staged docstore files in; see ``commit_staged``."""
+    commit_staged(directory, DOCSTORE_FILES)
+
+
+def discard_staged_docstore(directory: Path) -> None:
+    discard_staged(directory, DOCSTORE_FILES)
+
+
+def write_docstore(directory: Path, rows: Iterable[Tuple[str, Document]]) -> int:
+    """Stage and immediately commit a docstore; see ``stage_docstore``."""
+    count = stage_docstore(directory, rows)
+    commit_docstore(directory)
+    return count
+
+
+def _map_bytes(path: Path) -> Union[np.memmap, bytes]:
+    # np.memmap cannot map an empty file
+    if path.stat().st_size == 0:
+        return b""
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+class MmapDocstore:
+    """Read-only docstore over memory-mapped columnar files.
+
+    Documents are addressed by their position in the FAISS index, so search
+    results are hydrated one by one from the mapped bytes and nothing is
+    deserialised up front.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._text = _map_bytes(self.directory / TEXT_FILE)
+        self._meta = _map_bytes(self.directory / META_FILE)
+        self._text_offsets = np.load(self.directory / TEXT_OFFSETS_FILE, mmap_mode="r")
+        self._meta_offsets = np.load(self.directory / META_OFFSETS_FILE, mmap_mode="r")
+        self._ids = np.load(self.directory / IDS_FILE, mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self._text_offsets) - 1
+
+    def text(self, position: int) -> str:
+        start, end = int(self._text_offsets[position]), int(self._text_offsets[position + 1])
+        return bytes(self._text[start:end]).decode("utf-8")
+
+    def metadata(self, position: int) -> Dict[str, str]:
+        start, end = int(self._meta_offsets[position]), int(self._meta_offsets[position + 1])
+        return json.loads(bytes(self._meta[start:end]).decode("utf-8"))
+
+    def doc_id(self, position: int) -> str:
+        return self._ids[position].decode("ascii")
+
+    def ids(self) -> np.ndarray:
+        """The id column (ASCII bytes) in index order, memory-mapped."""
+        return self._ids
+
+    def document(self, position: int) -> Document:
+        return Document(page_content=self.text(position), metadata=self.metadata(position))
+
+    def search(self, search: Union[int, str]) -> Union[Document, str]:
+        # Docstore interface used by the LangChain FAISS wrapper
+        try:
+            position = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if position < 0 or position >= len(self):
+            return f"ID {search} not found."
+        return self.document(position)
+
+    def iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        for position in range(len(self)):
+            yield self.doc_id(position), self.document(position)
+
+
+class IdLookup:
+    """Resolve document ids to index positions by binary search over the sorted id column."""
+
+    def __init__(self, ids: np.ndarray):
+        self._order = np.argsort(ids, kind="stable")
+        self._sorted = np.asarray(ids)[self._order]
+
+    def get(self, doc_id: str) -> Optional[int]:
+        key = doc_id.encode("ascii")
+        slot = int(np.searchsorted(self._sorted, key))
+        if slot < len(self._sorted) and self._sorted[slot] == key:
+            return int(self._order[slot])
+        return None
+
+
+class PositionIndex(Mapping):
+    """Identity ``index_to_docstore_id`` mapping for a position-addressed docstore."""
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, position: int) -> int:
+        if not 0 <= position < self._size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,120 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """Two-tier cache for query embeddings.
+
+    A bounded in-memory LRU sits in front of an optional SQLite table so
+    cached vectors survive restarts. Keys combine the normalised text with
+    the embedding deployment, so switching models never serves stale vectors.
+    """
+
+    def __init__(self, deployment: str, max_entries: int = 2048, db_path: Optional[str] = None):
+        self.deployment = deployment
+        self.max_entries = max(0, max_entries)
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._connection: Optional[sqlite3.Connection] = None
+        if db_path:
+            path = Path(db_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(path), check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, deployment TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def normalise_text(text: str) -> str:
+        return re.sub(r"\s+", " ", text or "").strip().casefold()
+
+    def _key(self, normalised_text: str) -> str:
+        return hashlib.sha256(f"{self.deployment}\n{normalised_text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        if self.max_entries == 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, normalised_text: str) -> Optional[List[float]]:
+        key = self._key(normalised_text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return vector
+
+            if self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += 1
+                    return vector
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, normalised_text: str, vector: List[float]) -> None:
+        key = self._key(normalised_text)
+        with self._lock:
+            self._remember(key, list(vector))
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, deployment, vector, created_at) VALUES (?, ?, ?, ?)",
+                    (key, self.deployment, array("f", vector).tobytes(), time.time()),
+                )
+                self._connection.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            return {
+                **self._stats,
+                "hits": hits,
+                "requests": hits + self._stats["misses"],
+                "memory_entries": len(self._memory),
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves ``embed_query`` from an ``EmbeddingCache``.
+
+    Document embedding (index builds) passes straight through to the wrapped
+    model; only the per-request query path is cached.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        normalised = EmbeddingCache.normalise_text(text)
+        vector = self.cache.get(normalised)
+        if vector is None:
+            # Case and spacing only decide the cache key; the model still sees what the user typed
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(normalised, vector)
+        return vector
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import tiktoken
+from openai import RateLimitError
+
+
+class EmbeddingPipeline:
+    """Embed documents for index builds in checkpointed, parallel batches.
+
+    Every finished batch is written to ``checkpoint_dir`` under a key derived
+    from its row ids, so a crashed or throttled build picks up where it left
+    off. Rate-limited batches wait for the server's ``retry-after`` hint (or
+    an exponential backoff) before retrying.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: int = 256,
+        max_workers: int = 4,
+        max_retries: int = 6,
+        checkpoint_dir: Optional[Path] = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max(0, max_retries)
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        self.last_report: Dict[str, float] = {}
+        try:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            self._encoding = None
+
+    def _count_tokens(self, texts: Sequence[str]) -> int:
+        if self._encoding is None:
+            return sum(max(1, len(text) // 4) for text in texts)
+        return sum(len(self._encoding.encode(text, disallowed_special=())) for text in texts)
+
+    @staticmethod
+    def _batch_key(ids: Sequence[str]) -> str:
+        return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()
+
+    def _checkpoint_file(self, key: str) -> Optional[Path]:
+        if self.checkpoint_dir is None:
+            return None
+        return self.checkpoint_dir / f"{key}.npy"
+
+    @staticmethod
+    def _retry_after(exc: RateLimitError, attempt: int) -> float:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return min(60.0, 2 ** attempt)
+
+    def _embed_batch(self, ids: Sequence[str], texts: Sequence[str]) -> np.ndarray:
+        checkpoint = self._checkpoint_file(self._batch_key(ids))
+
+        attempt = 0
+        while True:
+            try:
+                vectors = np.asarray(self.embeddings.embed_documents(list(texts)), dtype="float32")
+                break
+            except RateLimitError as exc:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_after(exc, attempt)
+                print(f"Embedding batch throttled, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+        if checkpoint is not None:
+            # Write beside the checkpoint and swap it in, so a crash never leaves a truncated file behind
+            staged = checkpoint.with_name(f"{checkpoint.name}.tmp")
+            with staged.open("wb") as handle:
+                np.save(handle, vectors)
+            os.replace(staged, checkpoint)
+        return vectors
+
+    @staticmethod
+    def _read_checkpoint(checkpoint: Path, rows: int) -> Optional[np.ndarray]:
+        try:
+            vectors = np.load(checkpoint)
+        except (OSError, ValueError, EOFError) as exc:
+            print(f"Ignoring unreadable embedding checkpoint {checkpoint.name}: {exc}")
+            return None
+        if vectors.ndim != 2 or len(vectors) != rows:
+            print(f"Ignoring embedding checkpoint {checkpoint.name} with shape {vectors.shape}")
+            return None
+        return vectors
+
+    def embed(self, ids: Sequence[str], texts: Sequence[str]) -> List[List[float]]:
+        """Return one embedding per text, in input order."""
+        if len(ids) != len(texts):
+            raise ValueError("ids and texts must have the same length")
+        if self.checkpoint_dir is not None:
+            self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+        started = time.perf_counter()
+        batches = [
+            (ids[offset:offset + self.batch_size], texts[offset:offset + self.batch_size])
+            for offset in range(0, len(ids), self.batch_size)
+        ]
+
+        results: List[Optional[np.ndarray]] = [None] * len(batches)
+        pending = []
+        for position, (batch_ids, _) in enumerate(batches):
+            checkpoint = self._checkpoint_file(self._batch_key(batch_ids))
+            if checkpoint is not None and checkpoint.exists():
+                results[position] = self._read_checkpoint(checkpoint, len(batch_ids))
+            if results[position] is None:
+                pending.append(position)
+
+        resumed = len(batches) - len(pending)
+        embedded_rows = 0
+        embedded_tokens = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                position: executor.submit(self._embed_batch, *batches[position])
+                for position in pending
+            }
+            for position, future in futures.items():
+                results[position] = future.result()
+                embedded_rows += len(batches[position][0])
+                embedded_tokens += self._count_tokens(batches[position][1])
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.last_report = {
+            "rows": embedded_rows,
+            "tokens": embedded_tokens,
+            "batches": len(batches),
+            "resumed_batches": resumed,
+            "seconds": elapsed,
+            "rows_per_second": embedded_rows / elapsed,
+            "tokens_per_second": embedded_tokens / elapsed,
+        }
+        print(
+            f"Embedded {embedded_rows} rows ({embedded_tokens} tokens) in {elapsed:.1f}s: "
+            f"{self.last_report['rows_per_second']:.1f} rows/s, "
+            f"{self.last_report['tokens_per_second']:.1f} tokens/s "
+            f"({resumed}/{len(batches)} batches resumed from checkpoints)"
+        )
+
+        return [vector.tolist() for batch in results for vector in batch]
+
+    def clear_checkpoints(self) -> None:
+        if self.checkpoint_dir is not None and self.checkpoint_dir.exists():
+            shutil.rmtree(self.checkpoint_dir)
@@ -0,0 +1,116 @@
+from typing import Any, Dict
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+def index_params_from_settings(settings) -> Dict[str, Any]:
+    """Collect the build and search parameters for the configured index type."""
+    return {
+        "type": settings.FAISS_INDEX_TYPE.strip().lower(),
+        "hnsw_m": settings.FAISS_HNSW_M,
+        "hnsw_ef_construction": settings.FAISS_HNSW_EF_CONSTRUCTION,
+        "hnsw_ef_search": settings.FAISS_HNSW_EF_SEARCH,
+        "ivf_nlist": settings.FAISS_IVF_NLIST,
+        "ivf_nprobe": settings.FAISS_IVF_NPROBE,
+        "pq_m": settings.FAISS_PQ_M,
+        "pq_nbits": settings.FAISS_PQ_NBITS,
+    }
+
+
+def build_signature(params: Dict[str, Any]) -> Dict[str, Any]:
+    """The subset of parameters that requires rebuilding the index when changed."""
+    index_type = params["type"]
+    if index_type == "hnsw":
+        return {"type": index_type, "m": params["hnsw_m"], "ef_construction": params["hnsw_ef_construction"]}
+    if index_type == "ivf_flat":
+        return {"type": index_type, "nlist": params["ivf_nlist"]}
+    if index_type == "ivf_pq":
+        return {
+            "type": index_type,
+            "nlist": params["ivf_nlist"],
+            "pq_m": params["pq_m"],
+            "pq_nbits": params["pq_nbits"],
+        }
+    return {"type": "flat"}
+
+
+def build_index(vectors: np.ndarray, params: Dict[str, Any]) -> faiss.Index:
+    """Build an L2 index of the configured type over ``vectors`` (float32, n x d).
+
+    IVF variants are trained on the vectors themselves; ``nlist`` is capped so
+    every list gets enough training points. Falls back to a flat index when
+    the corpus is too small to train the requested structure.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    count, dimension = vectors.shape
+    index_type = params["type"]
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE {index_type!r}; expected one of {INDEX_TYPES}")
+
+    index: faiss.Index
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["hnsw_m"])
+        index.hnsw.efConstruction = params["hnsw_ef_construction"]
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = max(1, min(params["ivf_nlist"], count // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            if dimension % params["pq_m"]:
+                raise ValueError(f"FAISS_PQ_M ({params['pq_m']}) must divide the embedding dimension ({dimension})")
+            if count < 2 ** params["pq_nbits"]:
+                print(f"Only {count} vectors; too few to train IVF-PQ, using a flat index.")
+                index_type = "flat"
+            else:
+                index = faiss.IndexIVFPQ(quantizer, dimension, nlist, params["pq_m"], params["pq_nbits"])
+        if index_type != "flat":
+            index.train(vectors)
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+
+    if count:
+        index.add(vectors)
+    apply_search_params(index, params)
+    return index
+
+
+def apply_search_params(index: faiss.Index, params: Dict[str, Any]) -> None:
+    """Set query-time knobs (nprobe, efSearch); these never require a rebuild."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params["hnsw_ef_search"]
+        return
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.nprobe = min(params["ivf_nprobe"], ivf.nlist)
+
+
+def search_subset(index: faiss.Index, query: np.ndarray, k: int, subset: np.ndarray, params: Dict[str, Any]) -> np.ndarray:
+    """Search ``index`` for the ``k`` nearest ids among ``subset`` without copying their vectors.
+
+    The subset is passed to FAISS as a bitmap selector, so the index only
+    scores allowed ids. HNSW gets ``efSearch`` of at least ``k`` so a
+    filtered query can still fill its results; IVF keeps its ``nprobe``.
+    """
+    mask = np.zeros(index.ntotal, dtype=bool)
+    mask[subset] = True
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    if isinstance(index, faiss.IndexHNSW):
+        search_params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(params["hnsw_ef_search"], k))
+    else:
+        try:
+            ivf = faiss.extract_index_ivf(index)
+        except RuntimeError:
+            ivf = None
+        if ivf is not None:
+            search_params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+        else:
+            search_params = faiss.SearchParameters(sel=selector)
+    _, hits = index.search(np.asarray(query, dtype="float32").reshape(1, -1), k, params=search_params)
+    return hits[0]
@@ -0,0 +1,44 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+import pandas as pd
+from langchain.docstore.document import Document
+
+CONTENT_COLUMN_CANDIDATES = ["content", "post_content", "text", "body"]
+
+
+def row_hash(metadata: Dict[str, str]) -> str:
+    """Stable content hash of a CSV row, used as its docstore id."""
+    payload = json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def iter_csv_documents(csv_path: Path, chunksize: int = 5000) -> Iterator[Tuple[str, Document]]:
+    """Yield ``(row_hash, Document)`` pairs from a posts CSV, one chunk at a time.
+
+    Cells are read as strings, rows with empty content are filtered with
+    column-wise operations, and only one chunk is held in memory at a time.
+    """
+    content_col = None
+    for chunk in pd.read_csv(csv_path, chunksize=max(1, chunksize), dtype=str):
+        if content_col is None:
+            content_col = next((c for c in CONTENT_COLUMN_CANDIDATES if c in chunk.columns), None)
+            if content_col is None:
+                raise ValueError(
+                    f"CSV must contain one of the content columns: {CONTENT_COLUMN_CANDIDATES}. Found: {list(chunk.columns)}"
+                )
+
+        content = chunk[content_col]
+        chunk = chunk[content.notna() & content.str.strip().ne("")]
+        if chunk.empty:
+            continue
+
+        columns = list(chunk.columns)
+        values = chunk.to_numpy(dtype=object)
+        present = chunk.notna().to_numpy()
+        contents = chunk[content_col].tolist()
+        for text, row, row_present in zip(contents, values, present):
+            metadata = {column: value for column, value, keep in zip(columns, row, row_present) if keep}
+            yield row_hash(metadata), Document(page_content=text, metadata=metadata)
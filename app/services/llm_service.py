@@ -1,12 +1,31 @@
+import asyncio
 import random
 import re
+import threading
 import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from openai import AzureOpenAI
+from fastapi.concurrency import run_in_threadpool
+from openai import AsyncAzureOpenAI, AzureOpenAI
 
 from ..core.config import settings
+from ..core.metrics import LLM_COMPLETIONS, StageTimer, record_prompt_tokens, record_token_usage
+from ..db.database import SessionLocal
+from .client_state import ClientStateBackend, ClientStateStore, DatabaseClientStateBackend, InteractionRecord
+from . import prompt_templates
+from .prompt_budget import PromptBudgeter
+from .response_cache import SemanticResponseCache
+
+
+@dataclass
+class RetrievalContext:
+    """Similar-post search results computed once per request."""
+
+    topic: str
+    documents: List[Any] = field(default_factory=list)
+    filters: Dict[str, Any] = field(default_factory=dict)
 
 
 class LLMService:
@@ -69,19 +88,58 @@ class LLMService:
             api_key=settings.AZURE_OPENAI_API_KEY,
             api_version=settings.AZURE_OPENAI_API_VERSION,
         )
+        self.async_client = AsyncAzureOpenAI(
+            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+        )
+        self._generation_semaphore = asyncio.Semaphore(max(1, settings.LLM_MAX_CONCURRENT_GENERATIONS))
         self.deployment_name = settings.AZURE_OPENAI_DEPLOYMENT_NAME
+        self.response_cache = None
+        if settings.RESPONSE_CACHE_ENABLED:
+            self.response_cache = SemanticResponseCache(
+                similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+                ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+                max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            )
+        self.response_cache_tiers = {
+            tier.strip().lower() for tier in settings.RESPONSE_CACHE_TIERS.split(",") if tier.strip()
+        }
         self.vector_store_service = vector_store_service
 
-        self.client_memory: Dict[str, List[Dict]] = {}
-        self.client_last_hook: Dict[str, str] = {}
-        self.client_last_framework: Dict[str, str] = {}
-        self.client_last_cta: Dict[str, str] = {}
-        self.client_last_topic: Dict[str, str] = {}
+        self.client_state = ClientStateStore(
+            max_clients=settings.CLIENT_STATE_MAX_CLIENTS,
+            ttl_seconds=settings.CLIENT_STATE_TTL_SECONDS,
+            max_bytes=settings.CLIENT_STATE_MAX_BYTES,
+            history_limit=settings.CLIENT_HISTORY_LIMIT,
+            backend=self._create_client_state_backend(),
+            flush_interval=settings.CLIENT_STATE_FLUSH_INTERVAL_SECONDS,
+            refresh_seconds=settings.CLIENT_STATE_REFRESH_SECONDS,
+            history_refresh_seconds=settings.CLIENT_HISTORY_REFRESH_SECONDS,
+        )
+
+        self.prompt_budgeter = PromptBudgeter(
+            budget=settings.PROMPT_TOKEN_BUDGET,
+            encoding_name=settings.PROMPT_TOKENIZER_ENCODING,
+            max_item_tokens=settings.PROMPT_MAX_ITEM_TOKENS,
+        )
+
+        self._usage_lock = threading.Lock()
+        self._prompt_cache_usage = {"requests": 0, "cached_requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
 
         self.hooks = self._load_hooks()
         self.frameworks = self._load_frameworks()
         self.ctas = self._load_ctas()
 
+    @staticmethod
+    def _create_client_state_backend() -> Optional[ClientStateBackend]:
+        backend = settings.CLIENT_STATE_BACKEND.strip().lower()
+        if backend == "database":
+            return DatabaseClientStateBackend(SessionLocal, history_limit=settings.CLIENT_HISTORY_LIMIT)
+        if backend not in ("", "memory"):
+            raise ValueError(f"Unknown CLIENT_STATE_BACKEND: {settings.CLIENT_STATE_BACKEND}")
+        return None
+
     @staticmethod
     def _normalise_phrase(value: str) -> str:
         text = value.strip()
@@ -134,27 +192,28 @@ class LLMService:
     def _normalize_client_id(self, client_id: str) -> str:
         return client_id or "default"
 
-    def _get_client_memory(self, client_id: str) -> str:
-        history = self.client_memory.get(client_id, [])
+    def _client_history_items(self, client_id: str) -> List[str]:
+        history = self.client_state.history(client_id)
         if not history:
-            return ""
+            return []
 
         recent_history = history[-5:]
-        formatted_history = ""
+        items = []
         for interaction in recent_history:
-            topic = interaction.get("topic") or interaction.get("query")
-            hook = interaction.get("hook")
-            framework = interaction.get("framework")
-            cta = interaction.get("cta")
-            formatted_history += f"User request: {topic}\n"
-            if hook:
-                formatted_history += f"Hook used: {hook}\n"
-            if framework:
-                formatted_history += f"Framework used: {framework}\n"
-            if cta:
-                formatted_history += f"CTA used: {cta}\n"
-            formatted_history += f"Generated post: {interaction['response']}\n\n"
-        return formatted_history
+            topic = interaction.topic or interaction.query
+            item = f"User request: {topic}\n"
+            if interaction.hook:
+                item += f"Hook used: {interaction.hook}\n"
+            if interaction.framework:
+                item += f"Framework used: {interaction.framework}\n"
+            if interaction.cta:
+                item += f"CTA used: {interaction.cta}\n"
+            item += f"Generated post: {interaction.response}\n\n"
+            items.append(item)
+        return items
+
+    def _get_client_memory(self, client_id: str) -> str:
+        return "".join(self._client_history_items(client_id))
 
     def _update_client_memory(
         self,
@@ -166,61 +225,70 @@ class LLMService:
         cta: str,
         response: str,
     ) -> None:
-        if client_id not in self.client_memory:
-            self.client_memory[client_id] = []
-
-        self.client_memory[client_id].append(
-            {
-                "timestamp": time.time(),
-                "query": original_query,
-                "topic": topic,
-                "hook": hook,
-                "framework": framework,
-                "cta": cta,
-                "response": response,
-            }
+        self.client_state.append(
+            client_id,
+            InteractionRecord(
+                query=original_query,
+                topic=topic,
+                hook=hook,
+                framework=framework,
+                cta=cta,
+                response=response,
+            ),
         )
 
-        if len(self.client_memory[client_id]) > 20:
-            self.client_memory[client_id] = self.client_memory[client_id][-20:]
-
-        if topic:
-            self.client_last_topic[client_id] = topic
-        if hook:
-            self.client_last_hook[client_id] = hook
-        if framework:
-            self.client_last_framework[client_id] = framework
-        if cta:
-            self.client_last_cta[client_id] = cta
+    def _similar_post_items(self, similar_docs: List[Any]) -> List[str]:
+        items = []
+        for index, doc in enumerate(similar_docs or [], 1):
+            metadata = getattr(doc, "metadata", {}) or {}
+            author = metadata.get("profile_name") or "Unknown Author"
+            post_date = metadata.get("post_date") or ""
+            profile_url = metadata.get("profile_url") or ""
+
+            header_parts = [f"Example {index}"]
+            if author:
+                header_parts.append(f"by {author}")
+            if post_date:
+                header_parts.append(f"({post_date})")
+
+            header = " ".join(header_parts)
+            item = f"{header}:\n{doc.page_content.strip()}\n"
+            if profile_url:
+                item += f"Source: {profile_url}\n"
+            item += "\n"
+            items.append(item)
+        return items
+
+    def _format_similar_posts(self, similar_docs: List[Any]) -> str:
+        items = self._similar_post_items(similar_docs)
+        if not items:
+            return ""
+        return prompt_templates.EXAMPLES_INTRO + "".join(items)
 
-    def _retrieve_similar_posts(self, topic: str, top_k: int = 3) -> str:
+    def _search_similar_docs(self, topic: str, top_k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Any]:
         try:
-            similar_docs = self.vector_store_service.search_similar_posts(topic, k=top_k)
-            if not similar_docs:
-                return ""
-
-            examples = "Here are some example LinkedIn posts that might be relevant:\n\n"
-            for index, doc in enumerate(similar_docs, 1):
-                metadata = getattr(doc, "metadata", {}) or {}
-                author = metadata.get("profile_name") or "Unknown Author"
-                post_date = metadata.get("post_date") or ""
-                profile_url = metadata.get("profile_url") or ""
-
-                header_parts = [f"Example {index}"]
-                if author:
-                    header_parts.append(f"by {author}")
-                if post_date:
-                    header_parts.append(f"({post_date})")
-
-                header = " ".join(header_parts)
-                examples += f"{header}:\n{doc.page_content.strip()}\n"
-                if profile_url:
-                    examples += f"Source: {profile_url}\n"
-                examples += "\n"
-            return examples
+            if filters:
+                return self.vector_store_service.search_similar_posts(topic, k=top_k, filters=filters) or []
+            return self.vector_store_service.search_similar_posts(topic, k=top_k) or []
         except Exception as exc:
             print(f"Error retrieving similar posts: {exc}")
-            return ""
+            return []
+
+    def _retrieve_similar_posts(self, topic: str, top_k: int = 3) -> str:
+        return self._format_similar_posts(self._search_similar_docs(topic, top_k))
+
+    def build_retrieval_context(
+        self, query: str, client_id: str, top_k: int = 3, filters: Optional[Dict[str, Any]] = None
+    ) -> RetrievalContext:
+        """Resolve the request topic and run the similar-post search once.
+
+        The returned context is meant to be shared by every draft of a request
+        and by the ``similar_posts`` field of the API response.
+        """
+        client_key = self._normalize_client_id(client_id)
+        topic = self._resolve_request_topic(client_key, query)
+        filters = {name: value for name, value in (filters or {}).items() if value}
+        return RetrievalContext(topic=topic, documents=self._search_similar_docs(topic, top_k, filters), filters=filters)
 
     def _clean_query(self, query: str) -> str:
         cleaned = self._ALL_CHANGE_REGEX.sub(" ", query)
@@ -241,7 +309,7 @@ class LLMService:
         if cleaned:
             topic = cleaned
         elif reuse_previous:
-            topic = self.client_last_topic.get(client_id, "").strip()
+            topic = (self.client_state.get_last(client_id, "topic") or "").strip()
         else:
             topic = query.strip()
 
@@ -250,6 +318,14 @@ class LLMService:
 
         return topic
 
+    def _resolve_request_topic(self, client_id: str, query: str) -> str:
+        reuse_previous_topic = (
+            self._is_hook_change_request(query)
+            or self._is_framework_change_request(query)
+            or self._is_cta_change_request(query)
+        )
+        return self._resolve_topic(client_id, query, reuse_previous_topic)
+
     def _select_from_list(self, items: List[str], previous: Optional[str], force_change: bool) -> str:
         if not items:
             return ""
@@ -261,26 +337,23 @@ class LLMService:
                 candidates = items
         return random.choice(candidates)
 
-    def _select_hook(self, client_id: str, force_change: bool = False) -> str:
-        previous = self.client_last_hook.get(client_id)
-        selected = self._select_from_list(self.hooks, previous, force_change)
-        if selected:
-            self.client_last_hook[client_id] = selected
-        return selected
-
-    def _select_framework(self, client_id: str, force_change: bool = False) -> str:
-        previous = self.client_last_framework.get(client_id)
-        selected = self._select_from_list(self.frameworks, previous, force_change)
-        if selected:
-            self.client_last_framework[client_id] = selected
-        return selected
-
-    def _select_cta(self, client_id: str, force_change: bool = False) -> str:
-        previous = self.client_last_cta.get(client_id)
-        selected = self._select_from_list(self.ctas, previous, force_change)
-        if selected:
-            self.client_last_cta[client_id] = selected
-        return selected
+    def _select_last(
+        self, client_id: str, field: str, items: List[str], force_change: bool
+    ) -> Tuple[Optional[str], str]:
+        # Read and replace the previous choice in one step so concurrent requests for a client still rotate
+        previous, selected = self.client_state.update_last(
+            client_id, field, lambda previous: self._select_from_list(items, previous, force_change)
+        )
+        return previous, selected or ""
+
+    def _select_hook(self, client_id: str, force_change: bool = False) -> Tuple[Optional[str], str]:
+        return self._select_last(client_id, "hook", self.hooks, force_change)
+
+    def _select_framework(self, client_id: str, force_change: bool = False) -> Tuple[Optional[str], str]:
+        return self._select_last(client_id, "framework", self.frameworks, force_change)
+
+    def _select_cta(self, client_id: str, force_change: bool = False) -> Tuple[Optional[str], str]:
+        return self._select_last(client_id, "cta", self.ctas, force_change)
 
     def _build_prompt(
         self,
@@ -296,143 +369,436 @@ class LLMService:
         hook_change_requested: bool,
         framework_change_requested: bool,
         cta_change_requested: bool,
+        retrieval_context: Optional[RetrievalContext] = None,
+        token_report: Optional[Dict[str, int]] = None,
     ) -> List[Dict[str, str]]:
-        client_history = self._get_client_memory(client_id)
-        similar_posts = self._retrieve_similar_posts(topic)
-
-        system_prompt = (
-            """
-            
-            """
+        history_items = self._client_history_items(client_id)
+        if retrieval_context is None:
+            similar_docs = self._search_similar_docs(topic)
+        elif retrieval_context.topic == topic:
+            similar_docs = retrieval_context.documents
+        else:
+            # The topic was resolved again since retrieval; search it under the request's filters
+            similar_docs = self._search_similar_docs(topic, filters=retrieval_context.filters)
+        example_items = self._similar_post_items(similar_docs)
+
+        static = prompt_templates.static_block(bool(hook), is_pro_user)
+        requirements = prompt_templates.requirements_block(
+            hook=hook,
+            framework=framework,
+            cta=cta,
+            previous_hook=previous_hook,
+            previous_framework=previous_framework,
+            previous_cta=previous_cta,
+            hook_change_requested=hook_change_requested,
+            framework_change_requested=framework_change_requested,
+            cta_change_requested=cta_change_requested,
         )
 
-        if hook:
-            system_prompt += (
-                "\n- Start the post with the provided hook on its own line (customise bracketed placeholders to match the topic)"
-            )
+        # History is offered newest first so the budget keeps the most recent interactions
+        kept, report = self.prompt_budgeter.fit(
+            required=[
+                static,
+                requirements,
+                prompt_templates.topic_block(topic),
+                prompt_templates.USER_PROMPT,
+                prompt_templates.HISTORY_HEADER,
+                prompt_templates.EXAMPLES_INTRO,
+            ],
+            optional_sections=[("examples", example_items), ("history", list(reversed(history_items)))],
+        )
+        if token_report is not None:
+            token_report.update(report)
+
+        messages = prompt_templates.render_messages(
+            static=static,
+            history=list(reversed(kept["history"])),
+            examples=kept["examples"],
+            requirements=requirements,
+            topic=topic,
+        )
 
-        if is_pro_user:
-            system_prompt += (
-                "\n- For PRO users: Include more sophisticated content structures"
-                "\n- For PRO users: Add a hook at the beginning and call-to-action at the end"
-                "\n- For PRO users: Optimize for maximum engagement with advanced storytelling techniques"
-            )
+        return messages
 
-        full_context = system_prompt
+    def _prepare_generation(
+        self,
+        query: str,
+        client_id: str,
+        is_pro_user: bool,
+        retrieval_context: Optional[RetrievalContext] = None,
+        user_tier: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        client_key = self._normalize_client_id(client_id)
 
-        if hook:
-            full_context += (
-                "\n\nHOOK REQUIREMENTS:\n"
-                f"Use this hook as the opening line (adapt placeholders like [industry] or [goal] to the topic):\n{hook}\n"
-            )
-            if previous_hook and previous_hook != hook:
-                full_context += f"Avoid reusing the previous hook: {previous_hook}\n"
-            if hook_change_requested:
-                full_context += "Ensure the new hook feels noticeably different from the previous version."
-
-        if framework:
-            full_context += (
-                "\n\nFRAMEWORK TO FOLLOW:\n"
-                f"{framework}\n"
-                "Use this framework to shape the narrative (sections, sequencing, and transitions) while keeping the copy natural."
-            )
-            if previous_framework and previous_framework != framework:
-                full_context += f"\nDo not fall back to the former framework: {previous_framework}."
-            if framework_change_requested:
-                full_context += "\nMake the change of framework obvious in structure and flow."
-
-        if cta:
-            full_context += (
-                "\n\nCALL-TO-ACTION REQUIREMENT:\n"
-                f"Close the post with a CTA inspired by this line (adjust wording to fit tone while keeping the intent intact):\n{cta}\n"
-                "Place the CTA as the final sentence or paragraph."
-            )
-            if previous_cta and previous_cta != cta:
-                full_context += f"\nAvoid reusing the previous CTA phrase: {previous_cta}."
-            if cta_change_requested:
-                full_context += "\nEnsure the CTA feels clearly different from the prior one."
+        hook_change_requested = self._is_hook_change_request(query)
+        framework_change_requested = self._is_framework_change_request(query)
+        cta_change_requested = self._is_cta_change_request(query)
 
-        full_context += f"\n\nTOPIC OR REQUEST:\n{topic}"
+        reuse_previous_topic = hook_change_requested or framework_change_requested or cta_change_requested
 
-        if client_history:
-            full_context += "\n\nPREVIOUS INTERACTIONS WITH THIS USER:\n" + client_history
+        topic = self._resolve_topic(client_key, query, reuse_previous_topic)
+        previous_hook, selected_hook = self._select_hook(client_key, force_change=hook_change_requested)
+        previous_framework, selected_framework = self._select_framework(
+            client_key, force_change=framework_change_requested
+        )
+        previous_cta, selected_cta = self._select_cta(client_key, force_change=cta_change_requested)
 
-        if similar_posts:
-            full_context += "\n\n" + similar_posts
+        return {
+            "query": query,
+            "client_key": client_key,
+            "user_tier": user_tier,
+            "prompt_kwargs": {
+                "topic": topic,
+                "client_id": client_key,
+                "hook": selected_hook,
+                "framework": selected_framework,
+                "cta": selected_cta,
+                "is_pro_user": is_pro_user,
+                "previous_hook": previous_hook,
+                "previous_framework": previous_framework,
+                "previous_cta": previous_cta,
+                "hook_change_requested": hook_change_requested,
+                "framework_change_requested": framework_change_requested,
+                "cta_change_requested": cta_change_requested,
+                "retrieval_context": retrieval_context,
+                # Filled in by _build_prompt with per-section token counts, exported as prompt token metrics
+                "token_report": {},
+            },
+        }
+
+    def _completion_kwargs(self, messages: List[Dict[str, str]], num_candidates: int = 1) -> Dict[str, Any]:
+        return {
+            "model": self.deployment_name,
+            "messages": messages,
+            "n": max(1, num_candidates),
+            "temperature": 0.7,
+            "max_tokens": 800,
+            "top_p": 0.95,
+            "frequency_penalty": 0.5,
+            "presence_penalty": 0.5,
+        }
+
+    def _record_usage(self, response, tier: Optional[str] = None) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        record_token_usage(usage, tier)
+        details = getattr(usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            cached_tokens = details.get("cached_tokens") or 0
+        else:
+            cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        with self._usage_lock:
+            self._prompt_cache_usage["requests"] += 1
+            self._prompt_cache_usage["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            self._prompt_cache_usage["cached_tokens"] += cached_tokens
+            if cached_tokens:
+                self._prompt_cache_usage["cached_requests"] += 1
+
+    def prompt_cache_stats(self) -> Dict[str, float]:
+        """Provider prompt-prefix cache usage reported in completion ``usage``."""
+        with self._usage_lock:
+            stats = dict(self._prompt_cache_usage)
+        stats["hit_rate"] = stats["cached_requests"] / stats["requests"] if stats["requests"] else 0.0
+        stats["cached_token_ratio"] = (
+            stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        )
+        return stats
+
+    def response_cache_enabled_for(self, tier: str) -> bool:
+        return self.response_cache is not None and (tier or "").lower() in self.response_cache_tiers
+
+    def _response_cache_key(self, generation: Dict[str, Any], num_candidates: int) -> Tuple:
+        # Hook, framework and CTA are drawn at random per request, so they live in the entry rather than the key.
+        # Drafts are written with the client's history, so they are only reused for the same client and tier.
+        prompt_kwargs = generation["prompt_kwargs"]
+        retrieval_context = prompt_kwargs.get("retrieval_context")
+        return (
+            generation.get("user_tier"),
+            generation["client_key"],
+            prompt_kwargs["is_pro_user"],
+            max(1, num_candidates),
+            tuple(sorted((retrieval_context.filters if retrieval_context else {}).items())),
+        )
 
-        messages = [
-            {"role": "system", "content": full_context},
+    def _lookup_cached_response(
+        self, generation: Dict[str, Any], num_candidates: int, use_cache: bool
+    ) -> Optional[List[str]]:
+        """Return cached drafts for this generation, remembering the topic vector for a later store.
+
+        A hit also swaps in the hook, framework and CTA the cached drafts were
+        written with, so client memory records what the drafts actually use.
+        Queries asking to change any of them bypass the cache.
+        """
+        if not use_cache or self.response_cache is None:
+            return None
+        prompt_kwargs = generation["prompt_kwargs"]
+        if (
+            prompt_kwargs["hook_change_requested"]
+            or prompt_kwargs["framework_change_requested"]
+            or prompt_kwargs["cta_change_requested"]
+        ):
+            return None
+        # Same deadline as retrieval, so a slow embedding call can't hold up generation
+        vector = self.vector_store_service.embed_query_within_deadline(
+            prompt_kwargs["topic"], fallback="skipping the response cache"
+        )
+        if vector is None:
+            return None
+        generation["cache_vector"] = vector
+        entry = self.response_cache.get(self._response_cache_key(generation, num_candidates), vector)
+        if entry is None:
+            return None
+        for name in ("hook", "framework", "cta"):
+            prompt_kwargs[name] = entry[name]
+        return list(entry["texts"])
+
+    def _store_cached_response(
+        self, generation: Dict[str, Any], num_candidates: int, generated_texts: List[Optional[str]]
+    ) -> None:
+        vector = generation.get("cache_vector")
+        if self.response_cache is None or vector is None:
+            return
+        if not generated_texts or any(not text for text in generated_texts):
+            return
+        prompt_kwargs = generation["prompt_kwargs"]
+        self.response_cache.put(
+            self._response_cache_key(generation, num_candidates),
+            vector,
             {
-                "role": "user",
-                "content": (
-                    "Please craft a polished LinkedIn post about the topic above while respecting the hook, framework, and CTA requirements."
-                ),
+                "texts": list(generated_texts),
+                "hook": prompt_kwargs["hook"],
+                "framework": prompt_kwargs["framework"],
+                "cta": prompt_kwargs["cta"],
             },
-        ]
-
-        return messages
-
-    def generate_post(self, query: str, client_id: str, is_pro_user: bool = False) -> str:
-        try:
-            client_key = self._normalize_client_id(client_id)
-
-            hook_change_requested = self._is_hook_change_request(query)
-            framework_change_requested = self._is_framework_change_request(query)
-            cta_change_requested = self._is_cta_change_request(query)
-
-            reuse_previous_topic = hook_change_requested or framework_change_requested or cta_change_requested
-
-            previous_hook = self.client_last_hook.get(client_key)
-            previous_framework = self.client_last_framework.get(client_key)
-            previous_cta = self.client_last_cta.get(client_key)
-
-            topic = self._resolve_topic(client_key, query, reuse_previous_topic)
-            selected_hook = self._select_hook(client_key, force_change=hook_change_requested)
-            selected_framework = self._select_framework(client_key, force_change=framework_change_requested)
-            selected_cta = self._select_cta(client_key, force_change=cta_change_requested)
-
-            messages = self._build_prompt(
-                topic=topic,
-                client_id=client_key,
-                hook=selected_hook,
-                framework=selected_framework,
-                cta=selected_cta,
-                is_pro_user=is_pro_user,
-                previous_hook=previous_hook,
-                previous_framework=previous_framework,
-                previous_cta=previous_cta,
-                hook_change_requested=hook_change_requested,
-                framework_change_requested=framework_change_requested,
-                cta_change_requested=cta_change_requested,
-            )
-
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=800,
-                top_p=0.95,
-                frequency_penalty=0.5,
-                presence_penalty=0.5,
-            )
+        )
 
-            generated_text = response.choices[0].message.content
+    def _finalize_generation(self, generation: Dict[str, Any], generated_texts: List[Optional[str]]) -> List[str]:
+        prompt_kwargs = generation["prompt_kwargs"]
+        generated_posts: List[str] = []
+        for generated_text in generated_texts:
             if generated_text is None:
                 generated_text = "I couldn't generate a LinkedIn post at this time. Please try again."
 
             self._update_client_memory(
-                client_id=client_key,
-                original_query=query,
-                topic=topic,
-                hook=selected_hook,
-                framework=selected_framework,
-                cta=selected_cta,
+                client_id=generation["client_key"],
+                original_query=generation["query"],
+                topic=prompt_kwargs["topic"],
+                hook=prompt_kwargs["hook"],
+                framework=prompt_kwargs["framework"],
+                cta=prompt_kwargs["cta"],
                 response=generated_text,
             )
+            generated_posts.append(generated_text)
+
+        if not generated_posts:
+            generated_posts.append("I couldn't generate a LinkedIn post at this time. Please try again.")
+        return generated_posts
 
-            return generated_text
+    def generate_posts(
+        self,
+        query: str,
+        client_id: str,
+        is_pro_user: bool = False,
+        num_candidates: int = 1,
+        retrieval_context: Optional[RetrievalContext] = None,
+        use_cache: bool = False,
+        user_tier: Optional[str] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> List[str]:
+        """Generate ``num_candidates`` drafts from a single prompt and completion request.
+
+        The prompt (and its similar-post retrieval) is built once and Azure is
+        asked for ``n`` choices, so every draft shares the same hook,
+        framework and CTA selection. Pass ``retrieval_context`` from
+        ``build_retrieval_context`` to reuse a similar-post search already run
+        for this request. With ``use_cache`` a semantically close earlier
+        result for the same client, ``user_tier`` and filters is served, with
+        the hook, framework and CTA it was written with, without calling the
+        model.
+        Stage timings go to ``timer`` when the caller owns one.
+        """
+        owns_timer = timer is None
+        timer = timer or StageTimer()
+        try:
+            with timer.stage("prepare"):
+                generation = self._prepare_generation(query, client_id, is_pro_user, retrieval_context, user_tier)
+            with timer.stage("cache_lookup"):
+                cached_texts = self._lookup_cached_response(generation, num_candidates, use_cache)
+            if cached_texts is not None:
+                LLM_COMPLETIONS.labels(outcome="cache_hit", tier=timer.tier).inc()
+                with timer.stage("finalize"):
+                    return self._finalize_generation(generation, cached_texts)
+
+            with timer.stage("prompt_build"):
+                messages = self._build_prompt(**generation["prompt_kwargs"])
+            record_prompt_tokens(generation["prompt_kwargs"]["token_report"], timer.tier)
+
+            with timer.stage("completion"):
+                response = self.client.chat.completions.create(**self._completion_kwargs(messages, num_candidates))
+
+            self._record_usage(response, timer.tier)
+            LLM_COMPLETIONS.labels(outcome="completed", tier=timer.tier).inc()
+            generated_texts = [choice.message.content for choice in response.choices]
+            with timer.stage("finalize"):
+                self._store_cached_response(generation, num_candidates, generated_texts)
+                return self._finalize_generation(generation, generated_texts)
 
         except Exception as exc:
+            LLM_COMPLETIONS.labels(outcome="error", tier=timer.tier).inc()
             error_message = f"Error generating post: {exc}"
             print(error_message)
-            return "I'm sorry, I encountered an error while generating your LinkedIn post. Please try again later."
+            return ["I'm sorry, I encountered an error while generating your LinkedIn post. Please try again later."]
+        finally:
+            if owns_timer:
+                timer.finish()
+
+    def generate_post(self, query: str, client_id: str, is_pro_user: bool = False) -> str:
+        return self.generate_posts(query, client_id, is_pro_user)[0]
+
+    async def agenerate_posts(
+        self,
+        query: str,
+        client_id: str,
+        is_pro_user: bool = False,
+        num_candidates: int = 1,
+        retrieval_context: Optional[RetrievalContext] = None,
+        use_cache: bool = False,
+        user_tier: Optional[str] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> List[str]:
+        """Async counterpart of ``generate_posts`` backed by ``AsyncAzureOpenAI``.
+
+        Preparation, prompt building and finalisation may block (client state
+        backend, similarity search), so they run in the threadpool; hook,
+        framework and CTA are still swapped atomically, so concurrent calls
+        for the same client rotate through different options.
+        """
+        owns_timer = timer is None
+        timer = timer or StageTimer()
+        try:
+            with timer.stage("prepare"):
+                generation = await run_in_threadpool(
+                    self._prepare_generation, query, client_id, is_pro_user, retrieval_context, user_tier
+                )
+            with timer.stage("cache_lookup"):
+                cached_texts = await run_in_threadpool(
+                    self._lookup_cached_response, generation, num_candidates, use_cache
+                )
+            if cached_texts is not None:
+                LLM_COMPLETIONS.labels(outcome="cache_hit", tier=timer.tier).inc()
+                with timer.stage("finalize"):
+                    return await run_in_threadpool(self._finalize_generation, generation, cached_texts)
+
+            with timer.stage("prompt_build"):
+                messages = await run_in_threadpool(self._build_prompt, **generation["prompt_kwargs"])
+            record_prompt_tokens(generation["prompt_kwargs"]["token_report"], timer.tier)
+
+            # Waiting for a generation slot is its own stage so queueing is not mistaken for Azure latency
+            with timer.stage("queue_wait"):
+                await self._generation_semaphore.acquire()
+            try:
+                with timer.stage("completion"):
+                    response = await self.async_client.chat.completions.create(
+                        **self._completion_kwargs(messages, num_candidates)
+                    )
+            finally:
+                self._generation_semaphore.release()
+
+            self._record_usage(response, timer.tier)
+            LLM_COMPLETIONS.labels(outcome="completed", tier=timer.tier).inc()
+            generated_texts = [choice.message.content for choice in response.choices]
+            with timer.stage("finalize"):
+                self._store_cached_response(generation, num_candidates, generated_texts)
+                return await run_in_threadpool(self._finalize_generation, generation, generated_texts)
+
+        except Exception as exc:
+            LLM_COMPLETIONS.labels(outcome="error", tier=timer.tier).inc()
+            error_message = f"Error generating post: {exc}"
+            print(error_message)
+            return ["I'm sorry, I encountered an error while generating your LinkedIn post. Please try again later."]
+        finally:
+            if owns_timer:
+                timer.finish()
+
+    async def agenerate_post(self, query: str, client_id: str, is_pro_user: bool = False) -> str:
+        return (await self.agenerate_posts(query, client_id, is_pro_user))[0]
+
+    async def astream_posts(
+        self,
+        query: str,
+        client_id: str,
+        is_pro_user: bool = False,
+        num_candidates: int = 1,
+        retrieval_context: Optional[RetrievalContext] = None,
+        use_cache: bool = False,
+        user_tier: Optional[str] = None,
+        timer: Optional[StageTimer] = None,
+        on_complete: Optional[Callable[[List[str]], Awaitable[Any]]] = None,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """Yield ``(candidate_index, delta)`` pairs as completion deltas arrive.
+
+        Client memory is only updated once the stream has completed, so an
+        abandoned or failed stream leaves no partial post in the history.
+        ``on_complete`` is awaited with the finished drafts before that update
+        (e.g. to persist them); if it raises, memory is left untouched.
+        Errors propagate to the caller, which owns the transport.
+        """
+        owns_timer = timer is None
+        timer = timer or StageTimer()
+        try:
+            with timer.stage("prepare"):
+                generation = await run_in_threadpool(
+                    self._prepare_generation, query, client_id, is_pro_user, retrieval_context, user_tier
+                )
+            with timer.stage("cache_lookup"):
+                cached_texts = await run_in_threadpool(
+                    self._lookup_cached_response, generation, num_candidates, use_cache
+                )
+            if cached_texts is not None:
+                LLM_COMPLETIONS.labels(outcome="cache_hit", tier=timer.tier).inc()
+                for index, text in enumerate(cached_texts):
+                    yield index, text
+                if on_complete is not None:
+                    await on_complete([text for text in cached_texts if text])
+                await run_in_threadpool(self._finalize_generation, generation, cached_texts)
+                return
+
+            with timer.stage("prompt_build"):
+                messages = await run_in_threadpool(self._build_prompt, **generation["prompt_kwargs"])
+            record_prompt_tokens(generation["prompt_kwargs"]["token_report"], timer.tier)
+
+            parts: List[List[str]] = [[] for _ in range(max(1, num_candidates))]
+            with timer.stage("queue_wait"):
+                await self._generation_semaphore.acquire()
+            try:
+                started = time.perf_counter()
+                stream = await self.async_client.chat.completions.create(
+                    **self._completion_kwargs(messages, num_candidates), stream=True
+                )
+                async for chunk in stream:
+                    for choice in chunk.choices:
+                        delta = choice.delta.content
+                        if delta and choice.index < len(parts):
+                            if "first_token" not in timer.spans:
+                                timer.spans["first_token"] = time.perf_counter() - started
+                            parts[choice.index].append(delta)
+                            yield choice.index, delta
+                # Streamed responses carry no usage block, so only latency is recorded here
+                timer.spans["completion"] = timer.spans.get("completion", 0.0) + time.perf_counter() - started
+            except Exception:
+                LLM_COMPLETIONS.labels(outcome="error", tier=timer.tier).inc()
+                raise
+            finally:
+                self._generation_semaphore.release()
+
+            LLM_COMPLETIONS.labels(outcome="completed", tier=timer.tier).inc()
+            generated_texts = ["".join(chunks) if chunks else None for chunks in parts]
+            if on_complete is not None:
+                await on_complete([text for text in generated_texts if text])
+            with timer.stage("finalize"):
+                self._store_cached_response(generation, num_candidates, generated_texts)
+                await run_in_threadpool(self._finalize_generation, generation, generated_texts)
+        finally:
+            if owns_timer:
+                timer.finish()
@@ -0,0 +1,140 @@
+import json
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .staging import commit_staged, stage_files
+
+PARTITIONS_FILE = "partitions.json"
+PARTITION_POSITIONS_FILE = "partition_positions.npy"
+PARTITION_DATES_FILE = "partition_dates.npy"
+PARTITION_DATE_ORDER_FILE = "partition_date_order.npy"
+
+PARTITION_FILES = (PARTITIONS_FILE, PARTITION_POSITIONS_FILE, PARTITION_DATES_FILE, PARTITION_DATE_ORDER_FILE)
+
+FILTER_FIELDS = ("profile_name", "profile_url")
+DATE_FIELD = "post_date"
+
+# Author names that scrapers write when the real one is missing
+_PLACEHOLDER_NAMES = {"unknown", "unknown author", "n/a", "none"}
+
+_EPOCH = date(1970, 1, 1)
+# Day number stored for posts whose date could not be parsed
+_NO_DATE = np.iinfo(np.int32).min
+
+
+def partition_key(field: str, value: str) -> str:
+    key = str(value).strip().casefold()
+    if field == "profile_url":
+        key = key.rstrip("/")
+    return key
+
+
+def partitions_exist(directory: Path) -> bool:
+    return all((directory / name).exists() for name in PARTITION_FILES)
+
+
+def write_partitions(directory: Path, metadatas: Iterable[Dict[str, str]]) -> None:
+    """Precompute position lists per author field and a date ordering for filtered search.
+
+    Positions are the documents' positions in the FAISS index. Each
+    ``(field, value)`` group is stored as a contiguous, sorted slice of one
+    positions array; dates are stored as day numbers alongside the positions
+    sorted by date, so a date range is two binary searches.
+    """
+    groups: Dict[str, Dict[str, List[int]]] = {field: {} for field in FILTER_FIELDS}
+    raw_dates: List[Optional[str]] = []
+    unnamed: List[int] = []
+    for position, metadata in enumerate(metadatas):
+        for field in FILTER_FIELDS:
+            value = metadata.get(field)
+            if field == "profile_name" and (not value or partition_key(field, value) in _PLACEHOLDER_NAMES):
+                unnamed.append(position)
+                continue
+            if value:
+                groups[field].setdefault(partition_key(field, value), []).append(position)
+        raw_dates.append(metadata.get(DATE_FIELD))
+
+    parsed = pd.to_datetime(pd.Series(raw_dates, dtype=object), errors="coerce", utc=True, format="mixed")
+    valid = parsed.notna().to_numpy()
+    # Some scraped CSVs (including the bundled one) put the author name in post_date and "Unknown" in profile_name
+    for position in unnamed:
+        if not valid[position] and raw_dates[position] and str(raw_dates[position]).strip():
+            groups["profile_name"].setdefault(partition_key("profile_name", raw_dates[position]), []).append(position)
+
+    offsets: Dict[str, Dict[str, List[int]]] = {field: {} for field in FILTER_FIELDS}
+    chunks: List[np.ndarray] = []
+    cursor = 0
+    for field in FILTER_FIELDS:
+        for key, positions in groups[field].items():
+            offsets[field][key] = [cursor, cursor + len(positions)]
+            chunks.append(np.sort(np.asarray(positions, dtype=np.int64)))
+            cursor += len(positions)
+    positions_array = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    days = np.full(len(raw_dates), _NO_DATE, dtype=np.int32)
+    if valid.any():
+        days[valid] = (parsed[valid].dt.tz_localize(None) - pd.Timestamp(_EPOCH)).dt.days.to_numpy()
+    date_order = np.argsort(days, kind="stable").astype(np.int64)
+
+    arrays = {
+        PARTITION_POSITIONS_FILE: positions_array,
+        PARTITION_DATES_FILE: days,
+        PARTITION_DATE_ORDER_FILE: date_order,
+    }
+    stage_files(directory, arrays, {PARTITIONS_FILE: offsets})
+    commit_staged(directory, PARTITION_FILES)
+
+class MetadataPartitions:
+    """Resolve metadata filters to sorted index positions without scanning the docstore."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._offsets = json.loads((self.directory / PARTITIONS_FILE).read_text(encoding="utf-8"))
+        self._positions = np.load(self.directory / PARTITION_POSITIONS_FILE, mmap_mode="r")
+        self._days = np.load(self.directory / PARTITION_DATES_FILE, mmap_mode="r")
+        self._date_order = np.load(self.directory / PARTITION_DATE_ORDER_FILE, mmap_mode="r")
+        self._sorted_days = self._days[self._date_order]
+
+    def _field_positions(self, field: str, value: str) -> np.ndarray:
+        span = self._offsets.get(field, {}).get(partition_key(field, value))
+        if span is None:
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(self._positions[span[0]:span[1]])
+
+    def _date_positions(self, date_from: Optional[date], date_to: Optional[date]) -> np.ndarray:
+        if isinstance(date_from, datetime):
+            date_from = date_from.date()
+        if isinstance(date_to, datetime):
+            date_to = date_to.date()
+        # Undated posts sort first and are excluded from any date range
+        low = (date_from - _EPOCH).days if date_from else _NO_DATE + 1
+        high = (date_to - _EPOCH).days if date_to else np.iinfo(np.int32).max
+        start = np.searchsorted(self._sorted_days, max(low, _NO_DATE + 1), side="left")
+        end = np.searchsorted(self._sorted_days, high, side="right")
+        return np.sort(np.asarray(self._date_order[start:end]))
+
+    def select(
+        self,
+        profile_name: Optional[str] = None,
+        profile_url: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> Optional[np.ndarray]:
+        """Return the sorted positions matching every given filter, or ``None`` when no filter is set."""
+        selections = []
+        if profile_name:
+            selections.append(self._field_positions("profile_name", profile_name))
+        if profile_url:
+            selections.append(self._field_positions("profile_url", profile_url))
+        if date_from or date_to:
+            selections.append(self._date_positions(date_from, date_to))
+        if not selections:
+            return None
+        positions = selections[0]
+        for other in selections[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        return positions
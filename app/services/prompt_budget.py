@@ -0,0 +1,87 @@
+from typing import Dict, List, Sequence, Tuple
+
+import tiktoken
+
+
+class PromptBudgeter:
+    """Count prompt tokens and fit optional sections into a fixed budget.
+
+    Required text is always kept. Optional sections are lists of items
+    ordered from most to least important; items are admitted round-robin
+    across sections so every section keeps its best entries, each item is
+    capped at ``max_item_tokens``, and the last item that does not fit is
+    truncated when at least ``min_item_tokens`` remain.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        encoding_name: str = "cl100k_base",
+        max_item_tokens: int = 400,
+        min_item_tokens: int = 48,
+    ):
+        self.budget = budget
+        self.max_item_tokens = max_item_tokens
+        self.min_item_tokens = min_item_tokens
+        try:
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as exc:
+            print(f"Tokenizer {encoding_name} unavailable, estimating token counts: {exc}")
+            self._encoding = None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is None:
+            return max(1, len(text) // 4)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is None:
+            limit = max_tokens * 4
+            return text if len(text) <= limit else text[: limit - 4].rstrip() + "…"
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        # Leave room for the ellipsis marker
+        return self._encoding.decode(tokens[: max_tokens - 1]).rstrip() + "…"
+
+    def fit(
+        self, required: Sequence[str], optional_sections: Sequence[Tuple[str, Sequence[str]]]
+    ) -> Tuple[Dict[str, List[str]], Dict[str, int]]:
+        """Return the kept items per optional section and a per-section token report.
+
+        Kept items are returned in their original order.
+        """
+        report: Dict[str, int] = {"required": sum(self.count(text) for text in required)}
+        remaining = self.budget - report["required"]
+
+        kept: Dict[str, Dict[int, str]] = {name: {} for name, _ in optional_sections}
+        for name, _ in optional_sections:
+            report[name] = 0
+        dropped = 0
+
+        depth = max((len(items) for _, items in optional_sections), default=0)
+        for rank in range(depth):
+            for name, items in optional_sections:
+                if rank >= len(items):
+                    continue
+                item = items[rank]
+                if self.max_item_tokens:
+                    item = self.truncate(item, self.max_item_tokens)
+                tokens = self.count(item)
+                if tokens > remaining:
+                    if remaining < self.min_item_tokens:
+                        dropped += 1
+                        continue
+                    item = self.truncate(item, remaining)
+                    tokens = self.count(item)
+                kept[name][rank] = item
+                report[name] += tokens
+                remaining -= tokens
+
+        report["dropped_items"] = dropped
+        report["total"] = self.budget - remaining
+        return {name: [items[rank] for rank in sorted(items)] for name, items in kept.items()}, report
@@ -0,0 +1,120 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Base instructions shared by every request; keep this byte-stable so the
+# provider can reuse its cached prompt prefix.
+STATIC_INSTRUCTIONS = (
+    """
+            
+            """
+)
+
+HOOK_RULE = (
+    "\n- Start the post with the provided hook on its own line (customise bracketed placeholders to match the topic)"
+)
+
+PRO_RULES = (
+    "\n- For PRO users: Include more sophisticated content structures"
+    "\n- For PRO users: Add a hook at the beginning and call-to-action at the end"
+    "\n- For PRO users: Optimize for maximum engagement with advanced storytelling techniques"
+)
+
+USER_PROMPT = (
+    "Please craft a polished LinkedIn post about the topic above while respecting the hook, framework, and CTA requirements."
+)
+
+HISTORY_HEADER = "PREVIOUS INTERACTIONS WITH THIS USER:\n"
+EXAMPLES_INTRO = "Here are some example LinkedIn posts that might be relevant:\n\n"
+ITEM_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=None)
+def static_block(include_hook_rule: bool, is_pro_user: bool) -> str:
+    """Render (once) the instruction block that only depends on request flags."""
+    block = STATIC_INSTRUCTIONS
+    if include_hook_rule:
+        block += HOOK_RULE
+    if is_pro_user:
+        block += PRO_RULES
+    return block
+
+
+def requirements_block(
+    hook: str,
+    framework: str,
+    cta: str,
+    previous_hook: Optional[str],
+    previous_framework: Optional[str],
+    previous_cta: Optional[str],
+    hook_change_requested: bool,
+    framework_change_requested: bool,
+    cta_change_requested: bool,
+) -> str:
+    requirements = ""
+
+    if hook:
+        requirements += (
+            "\n\nHOOK REQUIREMENTS:\n"
+            f"Use this hook as the opening line (adapt placeholders like [industry] or [goal] to the topic):\n{hook}\n"
+        )
+        if previous_hook and previous_hook != hook:
+            requirements += f"Avoid reusing the previous hook: {previous_hook}\n"
+        if hook_change_requested:
+            requirements += "Ensure the new hook feels noticeably different from the previous version."
+
+    if framework:
+        requirements += (
+            "\n\nFRAMEWORK TO FOLLOW:\n"
+            f"{framework}\n"
+            "Use this framework to shape the narrative (sections, sequencing, and transitions) while keeping the copy natural."
+        )
+        if previous_framework and previous_framework != framework:
+            requirements += f"\nDo not fall back to the former framework: {previous_framework}."
+        if framework_change_requested:
+            requirements += "\nMake the change of framework obvious in structure and flow."
+
+    if cta:
+        requirements += (
+            "\n\nCALL-TO-ACTION REQUIREMENT:\n"
+            f"Close the post with a CTA inspired by this line (adjust wording to fit tone while keeping the intent intact):\n{cta}\n"
+            "Place the CTA as the final sentence or paragraph."
+        )
+        if previous_cta and previous_cta != cta:
+            requirements += f"\nAvoid reusing the previous CTA phrase: {previous_cta}."
+        if cta_change_requested:
+            requirements += "\nEnsure the CTA feels clearly different from the prior one."
+
+    return requirements.lstrip("\n")
+
+
+def topic_block(topic: str) -> str:
+    return f"TOPIC OR REQUEST:\n{topic}"
+
+
+def join_items(items: List[str]) -> str:
+    # Budget truncation drops an item's trailing blank line, so separate items here rather than relying on it
+    return ITEM_SEPARATOR.join(item.rstrip() for item in items)
+
+
+def render_messages(static: str, history: List[str], examples: List[str], requirements: str, topic: str) -> List[Dict[str, str]]:
+    """Assemble the chat messages from most static to most volatile content.
+
+    The first system message is identical for every request with the same
+    flags; client history (stable between a client's requests) comes next,
+    then the topic-dependent examples, and finally the per-request hook,
+    framework, CTA and topic.
+    """
+    context_sections = []
+    if history:
+        context_sections.append(HISTORY_HEADER + join_items(history))
+    if examples:
+        context_sections.append(EXAMPLES_INTRO + join_items(examples))
+    if requirements:
+        context_sections.append(requirements)
+    context_sections.append(topic_block(topic))
+
+    return [
+        {"role": "system", "content": static},
+        {"role": "system", "content": "\n\n".join(context_sections)},
+        {"role": "user", "content": USER_PROMPT},
+    ]
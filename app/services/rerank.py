@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists by summing ``1 / (k + rank)``; returns ``(id, score)`` best first."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+def mmr_select(
+    query_vector: Optional[Sequence[float]],
+    candidate_vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    authors: Optional[Sequence[Optional[str]]] = None,
+    max_per_author: Optional[int] = None,
+    relevance: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """Pick up to ``k`` candidates by maximal marginal relevance.
+
+    Each step takes the candidate maximising
+    ``lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected)``
+    using cosine similarity, so ``lambda_mult=1`` is plain relevance order and
+    lower values favour diversity. When ``authors`` and ``max_per_author``
+    are given, candidates from an author who already has that many picks are
+    skipped. A precomputed ``relevance`` score per candidate (e.g. a fused
+    rank score) replaces the query similarity and is min-max scaled to ``[0, 1]``;
+    ``query_vector`` may then be ``None``. Returns indices into
+    ``candidate_vectors`` in selection order.
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if k <= 0 or candidates.size == 0:
+        return []
+    candidates = _normalize(candidates)
+    if relevance is not None:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        spread = float(relevance.max() - relevance.min())
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+    else:
+        relevance = candidates @ _normalize(np.asarray(query_vector, dtype=np.float32))
+    # Running max similarity of every candidate to the already selected set
+    redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    author_counts = {}
+    selected: List[int] = []
+
+    while len(selected) < k and available.any():
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        available[best] = False
+
+        author = authors[best] if authors is not None else None
+        if max_per_author and author:
+            if author_counts.get(author, 0) >= max_per_author:
+                continue
+            author_counts[author] = author_counts.get(author, 0) + 1
+
+        selected.append(best)
+        redundancy = np.maximum(redundancy, candidates @ candidates[best])
+    return selected
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """Cache generated posts by topic embedding within an exact key.
+
+    Entries are grouped under an exact key (e.g. pro flag, number of drafts,
+    retrieval filters); within a group the closest stored topic vector wins
+    if its cosine similarity clears ``similarity_threshold``. The stored
+    value is returned as-is, so callers can keep whatever produced the
+    drafts alongside them. Entries expire after ``ttl_seconds`` and the
+    least recently used entry is evicted once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1024):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._groups: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _normalise(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype="float32")
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        group = self._groups.get(entry["key"], [])
+        if entry_id in group:
+            group.remove(entry_id)
+        if not group:
+            self._groups.pop(entry["key"], None)
+
+    def get(self, key: Hashable, vector: Sequence[float]) -> Optional[Any]:
+        query = self._normalise(vector)
+        now = time.time()
+        with self._lock:
+            best_id, best_score = None, -1.0
+            for entry_id in list(self._groups.get(key, [])):
+                entry = self._entries[entry_id]
+                if now - entry["created_at"] > self.ttl_seconds:
+                    self._drop(entry_id)
+                    continue
+                score = float(np.dot(entry["vector"], query))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.similarity_threshold:
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            return self._entries[best_id]["value"]
+
+    def put(self, key: Hashable, vector: Sequence[float], value: Any) -> None:
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "key": key,
+                "vector": self._normalise(vector),
+                "value": value,
+                "created_at": time.time(),
+            }
+            self._groups.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._drop(oldest_id)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries)}
@@ -0,0 +1,37 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+
+def staged_path(directory: Path, name: str) -> Path:
+    return directory / f"{name}.tmp"
+
+
+def stage_files(directory: Path, arrays: Dict[str, np.ndarray], documents: Optional[Dict[str, Any]] = None) -> None:
+    """Write ``.npy`` arrays and JSON documents beside their live files.
+
+    Nothing is visible to readers until ``commit_staged`` swaps them in.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, values in arrays.items():
+        with staged_path(directory, name).open("wb") as handle:
+            np.save(handle, values)
+    for name, value in (documents or {}).items():
+        staged_path(directory, name).write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+
+
+def commit_staged(directory: Path, names: Iterable[str]) -> None:
+    """Swap staged files in with ``os.replace``.
+
+    Readers that still map the previous version keep a valid view.
+    """
+    for name in names:
+        os.replace(staged_path(directory, name), directory / name)
+
+
+def discard_staged(directory: Path, names: Iterable[str]) -> None:
+    for name in names:
+        staged_path(directory, name).unlink(missing_ok=True)
@@ -1,90 +1,508 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from pathlib import Path
 
-import pandas as pd
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain.docstore.document import Document
 from langchain_openai import AzureOpenAIEmbeddings
 from ..core.config import settings
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .docstore import (
+    IdLookup,
+    MmapDocstore,
+    PositionIndex,
+    commit_docstore,
+    discard_staged_docstore,
+    docstore_exists,
+    stage_docstore,
+)
+from .embedding_pipeline import EmbeddingPipeline
+from .faiss_index import apply_search_params, build_index, build_signature, index_params_from_settings, search_subset
+from .dedup import PostFilter
+from .ingest import iter_csv_documents
+from .partitions import MetadataPartitions, partitions_exist, write_partitions
+from .rerank import mmr_select, reciprocal_rank_fusion
+from .bm25 import BM25Index, bm25_index_exists, write_bm25_index
 from pydantic import SecretStr
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so run a single worker there
+    fcntl = None
+
+INDEX_FILENAME = "index.faiss"
+INDEX_PARAMS_FILENAME = "index_params.json"
+VECTORS_FILENAME = "vectors.npy"
+MANIFEST_FILENAME = "manifest.json"
+LOCK_FILENAME = ".lock"
+
 class VectorStoreService:
-    def __init__(self):
+    def __init__(self, eager_load: bool = True):
         self.index_dir = Path(settings.FAISS_INDEX_PATH)
         self.dataset_path = Path(settings.LINKEDIN_POSTS_CSV_PATH)
+        self.index_params = index_params_from_settings(settings)
         self.embeddings = AzureOpenAIEmbeddings(
             azure_deployment=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME,
             api_key=SecretStr(settings.AZURE_OPENAI_API_KEY),
             azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
             api_version=settings.AZURE_OPENAI_API_VERSION,
         )
-        self.vector_store = self._load_or_create_vector_store()
+        self.embedding_cache = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                deployment=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME,
+                max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                db_path=settings.EMBEDDING_CACHE_PATH or None,
+            )
+            self.embeddings = CachedEmbeddings(self.embeddings, self.embedding_cache)
+        self.vector_store = None
+        self._vectors = None
+        self._partitions = None
+        self._bm25 = None
+        # Query embeddings run here so a search can stop waiting at its deadline; every concurrent
+        # generation needs a worker, or searches time out behind each other rather than on Azure
+        embed_workers = max(settings.RETRIEVAL_EMBEDDING_WORKERS, settings.LLM_MAX_CONCURRENT_GENERATIONS, 1)
+        self._embed_executor = ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="query-embed")
+        # One slot per worker, so the executor never builds a backlog past the deadline
+        self._embed_slots = threading.BoundedSemaphore(embed_workers)
+        self.load_error = None
+        self.load_attempts = 0
+        self.last_ingest_stats = {}
+        self._ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._loader = None
+        if eager_load:
+            self.load()
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def load(self):
+        """Load (or build) the index; searches return no results until this completes."""
+        with self._load_lock:
+            if self._ready.is_set():
+                return self.vector_store
+            self.vector_store = self._load_or_create_vector_store()
+            self.load_error = None
+            self._ready.set()
+            return self.vector_store
+
+    def _background_load(self):
+        # Retry with exponential backoff; a worker that gave up would serve without retrieval until restarted
+        delay = settings.INDEX_LOAD_RETRY_SECONDS
+        while True:
+            self.load_attempts += 1
+            try:
+                self.load()
+                print("Vector store ready.")
+                return
+            except Exception as exc:
+                self.load_error = str(exc)
+                if delay <= 0:
+                    print(f"Failed to load vector store: {exc}")
+                    return
+                print(f"Failed to load vector store (attempt {self.load_attempts}), retrying in {delay:.0f}s: {exc}")
+            time.sleep(delay)
+            delay = min(delay * 2, settings.INDEX_LOAD_RETRY_MAX_SECONDS)
+
+    def start_background_load(self):
+        """Start loading the index on a daemon thread (idempotent); failed loads are retried with backoff."""
+        with self._load_lock:
+            if self._loader is None and not self._ready.is_set():
+                self._loader = threading.Thread(target=self._background_load, name="vector-store-warmup", daemon=True)
+                self._loader.start()
     
+    def _index_exists(self):
+        # The manifest is written after every other file of a build, so without it the files may not belong together
+        return (
+            (self.index_dir / MANIFEST_FILENAME).exists()
+            and (self.index_dir / INDEX_FILENAME).exists()
+            and (self.index_dir / VECTORS_FILENAME).exists()
+            and docstore_exists(self.index_dir)
+        )
+
+    def _saved_index_signature(self):
+        params_file = self.index_dir / INDEX_PARAMS_FILENAME
+        if not params_file.exists():
+            return None
+        try:
+            return json.loads(params_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _stage_search_index(self, vectors):
+        """Build the configured ANN index and write it beside the live files.
+
+        Returns the index and the ``(staged, live)`` path pairs to swap in.
+        """
+        index = build_index(vectors, self.index_params)
+        staged_index = self.index_dir / f"{INDEX_FILENAME}.tmp"
+        faiss.write_index(index, str(staged_index))
+        staged_params = self.index_dir / f"{INDEX_PARAMS_FILENAME}.tmp"
+        staged_params.write_text(json.dumps(build_signature(self.index_params)), encoding="utf-8")
+        return index, [
+            (staged_index, self.index_dir / INDEX_FILENAME),
+            (staged_params, self.index_dir / INDEX_PARAMS_FILENAME),
+        ]
+
+    def _write_search_index(self, vectors):
+        """Build the configured ANN index from the stored vectors and swap it in."""
+        index, staged = self._stage_search_index(vectors)
+        for staged_path, live_path in staged:
+            os.replace(staged_path, live_path)
+        return index
+
+    def _load_store(self):
+        """Load the index for serving; documents stay memory-mapped and are hydrated per hit."""
+        if self._saved_index_signature() != build_signature(self.index_params):
+            print(f"Rebuilding {self.index_params['type']} index from stored vectors.")
+            index = self._write_search_index(np.load(self.index_dir / VECTORS_FILENAME))
+        else:
+            index = faiss.read_index(str(self.index_dir / INDEX_FILENAME))
+            apply_search_params(index, self.index_params)
+        # Exact vectors for re-ranking, mapped rather than reconstructed from a possibly lossy index
+        self._vectors = np.load(self.index_dir / VECTORS_FILENAME, mmap_mode="r")
+        docstore = MmapDocstore(self.index_dir)
+        if not partitions_exist(self.index_dir):
+            write_partitions(self.index_dir, (docstore.metadata(position) for position in range(len(docstore))))
+        self._partitions = MetadataPartitions(self.index_dir)
+        if not bm25_index_exists(self.index_dir):
+            write_bm25_index(self.index_dir, (docstore.text(position) for position in range(len(docstore))))
+        self._bm25 = BM25Index(self.index_dir)
+        return FAISS(self.embeddings, index, docstore, PositionIndex(len(docstore)))
+
+    def _write_lookup_indexes(self):
+        """Rebuild the partitions and BM25 index from the saved docstore."""
+        docstore = MmapDocstore(self.index_dir)
+        write_partitions(self.index_dir, (docstore.metadata(position) for position in range(len(docstore))))
+        write_bm25_index(self.index_dir, (docstore.text(position) for position in range(len(docstore))))
+
+    @contextmanager
+    def _index_lock(self):
+        """Hold an exclusive lock on the index directory across processes.
+
+        Every worker loads the index at startup, and a load may build it,
+        rebuild the ANN index or backfill partitions and BM25 through fixed
+        ``*.tmp`` paths; the lock lets one worker do that while the others
+        wait and then load the finished files.
+        """
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with (self.index_dir / LOCK_FILENAME).open("a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
     def _load_or_create_vector_store(self):
-        index_file = self.index_dir / "index.faiss"
-        store_file = self.index_dir / "index.pkl"
+        # State is checked only once the lock is held, so waiting workers see what the holder wrote
+        with self._index_lock():
+            return self._load_or_create_unlocked()
+
+    def _load_or_create_unlocked(self):
+        index_file = self.index_dir / INDEX_FILENAME
 
-        if index_file.exists() and store_file.exists():
+        if self._index_exists():
             if not self.dataset_path.exists() or index_file.stat().st_mtime >= self.dataset_path.stat().st_mtime:
-                return FAISS.load_local(str(self.index_dir), self.embeddings, allow_dangerous_deserialization=True)
+                return self._load_store()
 
         if self.dataset_path.exists():
             return self._build_vector_store_from_csv(self.dataset_path)
-
-        self.index_dir.mkdir(parents=True, exist_ok=True)
         return None
 
-    def _build_vector_store_from_csv(self, csv_path: Path):
-        if not csv_path.exists():
+    def _read_manifest(self):
+        manifest_file = self.index_dir / MANIFEST_FILENAME
+        if not manifest_file.exists():
             return None
+        try:
+            manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            print(f"Ignoring unreadable index manifest {manifest_file}: {exc}")
+            return None
+        if manifest.get("embedding_deployment") != settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME:
+            return None
+        return manifest
+
+    def _clear_manifest(self):
+        (self.index_dir / MANIFEST_FILENAME).unlink(missing_ok=True)
 
-        df = pd.read_csv(csv_path)
-        if df.empty:
+    def _write_manifest(self):
+        manifest = {"embedding_deployment": settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME}
+        staged = self.index_dir / f"{MANIFEST_FILENAME}.tmp"
+        staged.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(staged, self.index_dir / MANIFEST_FILENAME)
+
+    def _existing_docstore(self):
+        """The saved docstore when the index can be updated in place, else ``None``."""
+        if self._read_manifest() is None or not self._index_exists():
+            return None
+        docstore = MmapDocstore(self.index_dir)
+        vector_rows = np.load(self.index_dir / VECTORS_FILENAME, mmap_mode="r").shape[0]
+        if vector_rows != len(docstore):
+            print(f"Index has {len(docstore)} documents but {vector_rows} vectors; rebuilding it.")
             return None
+        return docstore
 
-        content_col_candidates = ["content", "post_content", "text", "body"]
-        content_col = next((c for c in content_col_candidates if c in df.columns), None)
-        if content_col is None:
-            raise ValueError(
-                f"CSV must contain one of the content columns: {content_col_candidates}. Found: {list(df.columns)}"
-            )
+    def _embed_rows(self, pipeline, pending, vector_handle):
+        vectors = pipeline.embed([row_id for row_id, _ in pending], [doc.page_content for _, doc in pending])
+        vector_handle.write(np.asarray(vectors, dtype="float32").tobytes())
+        yield from pending
 
-        documents = []
-        for _, row in df.iterrows():
-            content = row.get(content_col)
-            if pd.isna(content) or str(content).strip() == "":
-                continue
-
-            metadata = {
-                key: ("" if pd.isna(value) else str(value))
-                for key, value in row.items()
-                if not pd.isna(value)
-            }
-            documents.append(
-                Document(
-                    page_content=str(content),
-                    metadata=metadata
-                )
-            )
+    def _stage_vectors(self, raw_file: Path, rows: int) -> Path:
+        """Convert the raw float32 rows written during a build into a staged ``vectors.npy``."""
+        dimension = raw_file.stat().st_size // (4 * rows)
+        raw = np.memmap(raw_file, dtype="float32", mode="r", shape=(rows, dimension))
+        staged = self.index_dir / f"{VECTORS_FILENAME}.tmp"
+        vectors = np.lib.format.open_memmap(staged, mode="w+", dtype="float32", shape=(rows, dimension))
+        for start in range(0, rows, settings.INGEST_BATCH_ROWS):
+            vectors[start:start + settings.INGEST_BATCH_ROWS] = raw[start:start + settings.INGEST_BATCH_ROWS]
+        vectors.flush()
+        del vectors, raw
+        raw_file.unlink()
+        return staged
 
-        if not documents:
+    def _build_vector_store_from_csv(self, csv_path: Path):
+        """Build or update the index from the CSV in one streaming pass."""
+        if not csv_path.exists():
             return None
 
         self.index_dir.mkdir(parents=True, exist_ok=True)
-        self.vector_store = FAISS.from_documents(documents, self.embeddings)
-        self.vector_store.save_local(str(self.index_dir))
+        previous = self._existing_docstore()
+        rebuilding = previous is None
+        if rebuilding:
+            previous_vectors, previous_positions, keep = None, None, np.zeros(0, dtype=bool)
+        else:
+            previous_vectors = np.load(self.index_dir / VECTORS_FILENAME, mmap_mode="r")
+            previous_positions = IdLookup(previous.ids())
+            keep = np.zeros(len(previous), dtype=bool)
+
+        pipeline = self._embedding_pipeline()
+        post_filter = self._post_filter()
+        added = [0]
+
+        # New rows are embedded in INGEST_BATCH_ROWS slices and streamed to the docstore and a raw vector
+        # file; only ids, the keep-mask and dedup fingerprints grow with the corpus
+        def rows(vector_handle):
+            seen_new = set()
+            pending = []
+            for row_id, document in iter_csv_documents(csv_path, chunksize=settings.INGEST_CHUNK_SIZE):
+                position = previous_positions.get(row_id) if previous_positions is not None else None
+                if keep[position] if position is not None else row_id in seen_new:
+                    continue
+                # Filtering runs over every row, indexed or not, so the kept set only depends on the CSV
+                if not post_filter.accept(document.page_content):
+                    continue
+                if position is not None:
+                    keep[position] = True
+                    continue
+                seen_new.add(row_id)
+                pending.append((row_id, document))
+                if len(pending) >= settings.INGEST_BATCH_ROWS:
+                    yield from self._embed_rows(pipeline, pending, vector_handle)
+                    added[0] += len(pending)
+                    pending = []
+            if pending:
+                yield from self._embed_rows(pipeline, pending, vector_handle)
+                added[0] += len(pending)
+            # Rows already indexed keep their stored vectors; rows gone from the CSV are dropped here
+            for position in np.flatnonzero(keep):
+                vector_handle.write(np.asarray(previous_vectors[position], dtype="float32").tobytes())
+                yield previous.doc_id(position), previous.document(position)
+
+        raw_vectors = self.index_dir / f"{VECTORS_FILENAME}.rows.tmp"
+        with raw_vectors.open("wb") as vector_handle:
+            total = stage_docstore(self.index_dir, rows(vector_handle))
+        del previous, previous_vectors
+
+        self.last_ingest_stats = dict(post_filter.stats)
+        print(f"Ingest filter: {post_filter.summary()}")
+
+        if not total:
+            # Nothing to serve; drop the index so the next load doesn't find a partial one
+            raw_vectors.unlink()
+            discard_staged_docstore(self.index_dir)
+            self._clear_manifest()
+            for name in (INDEX_FILENAME, VECTORS_FILENAME):
+                (self.index_dir / name).unlink(missing_ok=True)
+            return None
+
+        if rebuilding:
+            print(f"Built FAISS index with {added[0]} posts.")
+        else:
+            print(f"Updated FAISS index: {added[0]} posts added, {len(keep) - int(keep.sum())} removed.")
+
+        # Stage every file first so the live set only changes in the short commit below
+        staged_vectors = self._stage_vectors(raw_vectors, total)
+        _, staged_index = self._stage_search_index(np.load(staged_vectors, mmap_mode="r"))
+        # A crash mid-commit leaves no manifest, so the next load rebuilds rather than pairing
+        # documents with another build's vectors
+        self._clear_manifest()
+        for staged_path, live_path in [(staged_vectors, self.index_dir / VECTORS_FILENAME), *staged_index]:
+            os.replace(staged_path, live_path)
+        commit_docstore(self.index_dir)
+        self._write_lookup_indexes()
+        self._write_manifest()
+        pipeline.clear_checkpoints()
+        self.vector_store = self._load_store()
         return self.vector_store
 
+    def _post_filter(self):
+        return PostFilter(
+            min_chars=settings.INGEST_MIN_CHARS,
+            min_words=settings.INGEST_MIN_WORDS,
+            max_distance=settings.INGEST_DEDUP_MAX_DISTANCE,
+            dedup=settings.INGEST_DEDUP_ENABLED,
+        )
+
+    def _embedding_pipeline(self):
+        return EmbeddingPipeline(
+            self.embeddings,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_workers=settings.EMBEDDING_MAX_WORKERS,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+            checkpoint_dir=self.index_dir / "checkpoints",
+        )
+
     def load_posts_from_csv(self, csv_path):
         csv_path = Path(csv_path)
-        return self._build_vector_store_from_csv(csv_path)
+        with self._index_lock():
+            store = self._build_vector_store_from_csv(csv_path)
+        self._ready.set()
+        return store
 
     def _ensure_vector_store(self):
+        # While the index is still warming up, callers get no retrieval rather than blocking on the load
+        if not self._ready.is_set():
+            return None
         if self.vector_store is None:
             self.vector_store = self._load_or_create_vector_store()
         return self.vector_store
 
-    def search_similar_posts(self, query, k=3):
+    def embed_query_within_deadline(self, query, fallback="using lexical results only"):
+        """Embed the query, or return ``None`` (logging ``fallback``) if it fails or misses the deadline."""
+        deadline = settings.RETRIEVAL_EMBEDDING_DEADLINE_SECONDS
+        started = time.monotonic()
+        # Waiting for a free worker counts against the deadline
+        if not self._embed_slots.acquire(timeout=deadline if deadline > 0 else None):
+            print(f"No query embedding worker freed up within {deadline}s; {fallback}.")
+            return None
+        try:
+            future = self._embed_executor.submit(self.embeddings.embed_query, query)
+        except Exception:
+            self._embed_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._embed_slots.release())
+        try:
+            remaining = max(0.0, deadline - (time.monotonic() - started)) if deadline > 0 else None
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # An embedding that already started keeps running and still lands in the query cache for next time
+            future.cancel()
+            print(f"Query embedding exceeded {deadline}s; {fallback}.")
+        except Exception as exc:
+            print(f"Query embedding failed; {fallback}: {exc}")
+        return None
+
+    def _vector_candidates(self, store, query_vector, fetch_k, subset):
+        """Top ``fetch_k`` index positions for the query vector, restricted to ``subset`` if given."""
+        if subset is not None and len(subset) > settings.RETRIEVAL_EXACT_SCAN_MAX_ROWS:
+            # Wide filters (e.g. long date ranges) would copy a large slice of the vectors; let the index skip the rest
+            hits = search_subset(store.index, query_vector, fetch_k, subset, self.index_params)
+            return [int(position) for position in hits if position >= 0]
+        if subset is not None:
+            # Small subsets are cheapest as an exact scan of their stored vectors
+            vectors = np.asarray(self._vectors[subset], dtype=np.float32)
+            distances = ((vectors - np.asarray(query_vector, dtype=np.float32)) ** 2).sum(axis=1)
+            if len(distances) > fetch_k:
+                nearest = np.argpartition(distances, fetch_k)[:fetch_k]
+            else:
+                nearest = np.arange(len(distances))
+            nearest = nearest[np.argsort(distances[nearest])]
+            return [int(subset[i]) for i in nearest]
+        _, hits = store.index.search(np.asarray([query_vector], dtype="float32"), fetch_k)
+        return [int(position) for position in hits[0] if position >= 0]
+
+    def search_similar_posts(
+        self,
+        query,
+        k=3,
+        filters=None,
+        diversify=None,
+        hybrid=None,
+        fetch_k=None,
+        lambda_mult=None,
+        max_per_author=None,
+    ):
+        """Return up to ``k`` posts similar to ``query``, optionally filtered, hybrid and MMR-diversified."""
         store = self._ensure_vector_store()
         if not store:
             return []
-        return store.similarity_search(query, k=k)
\ No newline at end of file
+        filters = {name: value for name, value in (filters or {}).items() if value}
+        if diversify is None:
+            diversify = settings.RETRIEVAL_MMR_ENABLED
+        if hybrid is None:
+            hybrid = settings.RETRIEVAL_HYBRID_ENABLED
+        docstore = store.docstore
+        if self._vectors is None or not isinstance(docstore, MmapDocstore):
+            return store.similarity_search(query, k=k)
+        hybrid = hybrid and self._bm25 is not None
+        if not diversify and not filters and not hybrid:
+            return store.similarity_search(query, k=k)
+
+        fetch_k = max(k, fetch_k or settings.RETRIEVAL_FETCH_K)
+        lambda_mult = settings.RETRIEVAL_MMR_LAMBDA if lambda_mult is None else lambda_mult
+        max_per_author = settings.RETRIEVAL_MAX_PER_AUTHOR if max_per_author is None else max_per_author
+        if filters.get("profile_name") or filters.get("profile_url"):
+            # Asking for one author's style makes the per-author cap meaningless
+            max_per_author = 0
+
+        subset = None
+        if filters and self._partitions is not None:
+            # Author and date filters resolve through the build-time partitions, so only matching posts are scored
+            subset = self._partitions.select(**filters)
+            if subset is not None and subset.size == 0:
+                return []
+
+        relevance = None
+        if hybrid:
+            # BM25 alone ranks the candidates when the query embedding misses its deadline
+            query_vector = self.embed_query_within_deadline(query)
+            rankings = [[position for position, _ in self._bm25.search(query, fetch_k, candidates=subset)]]
+            if query_vector is not None:
+                rankings.insert(0, self._vector_candidates(store, query_vector, fetch_k, subset))
+            fused = reciprocal_rank_fusion(rankings, k=settings.RETRIEVAL_RRF_K)[:fetch_k]
+            positions = [position for position, _ in fused]
+            relevance = [score for _, score in fused]
+        else:
+            query_vector = self.embeddings.embed_query(query)
+            positions = self._vector_candidates(store, query_vector, fetch_k, subset)
+        if not positions:
+            return []
+        if not diversify:
+            return [docstore.document(position) for position in positions[:k]]
+        # MMR re-ranks with the stored vectors, at most max_per_author posts per profile_url
+        authors = [docstore.metadata(position).get("profile_url") for position in positions]
+        order = mmr_select(
+            query_vector,
+            self._vectors[positions],
+            k,
+            lambda_mult=lambda_mult,
+            authors=authors,
+            max_per_author=max_per_author,
+            relevance=relevance,
+        )
+        return [docstore.document(positions[i]) for i in order]
+
+    def embedding_cache_stats(self):
+        if self.embedding_cache is None:
+            return {}
+        return self.embedding_cache.stats()
\ No newline at end of file
@@ -0,0 +1,80 @@
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.db import crud, models
+from app.db.database import create_db_engine
+
+
+def legacy_engine(url: str):
+	# The original configuration: default rollback journal and pooling, no pragmas
+	return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def run(label: str, engine, writers: int, writes: int, readers: int):
+	models.Base.metadata.create_all(bind=engine)
+	Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+	with Session() as db:
+		for worker in range(writers):
+			crud.get_or_create_user(db, f"bench-user-{worker}")
+
+	errors = []
+	reads = [0]
+	stop = threading.Event()
+
+	def write(worker: int):
+		with Session() as db:
+			for number in range(writes):
+				try:
+					crud.save_post(db, user_id=f"bench-user-{worker}", query="benchmark", content=f"post {number}")
+				except OperationalError as exc:
+					db.rollback()
+					errors.append(exc)
+
+	def read(worker: int):
+		with Session() as db:
+			while not stop.is_set():
+				crud.get_clients(db, f"bench-user-{worker % max(1, writers)}")
+				reads[0] += 1
+
+	reader_threads = [threading.Thread(target=read, args=(worker,)) for worker in range(readers)]
+	writer_threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+	for thread in reader_threads:
+		thread.start()
+	started = time.perf_counter()
+	for thread in writer_threads:
+		thread.start()
+	for thread in writer_threads:
+		thread.join()
+	elapsed = time.perf_counter() - started
+	stop.set()
+	for thread in reader_threads:
+		thread.join()
+	engine.dispose()
+
+	committed = writers * writes - len(errors)
+	print(
+		f"{label:<7} {committed:>7} writes  {elapsed:8.2f}s  {committed / elapsed:9.1f} writes/s  "
+		f"{reads[0] / elapsed:9.1f} reads/s  {len(errors):>5} lock errors"
+	)
+
+
+def main(args):
+	with tempfile.TemporaryDirectory() as directory:
+		for label, factory in (("legacy", legacy_engine), ("tuned", create_db_engine)):
+			url = f"sqlite:///{Path(directory) / f'{label}.db'}"
+			run(label, factory(url), args.writers, args.writes, args.readers)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compare SQLite write throughput under concurrency for the legacy and tuned engines")
+	parser.add_argument("--writers", type=int, default=8, help="Concurrent writer threads")
+	parser.add_argument("--writes", type=int, default=200, help="save_post calls per writer")
+	parser.add_argument("--readers", type=int, default=4, help="Concurrent reader threads running get_clients")
+	main(parser.parse_args())
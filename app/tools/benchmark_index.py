@@ -0,0 +1,94 @@
+import argparse
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.faiss_index import INDEX_TYPES, build_index, index_params_from_settings
+
+
+def load_vectors(index_path: str, synthetic: int, dimension: int):
+	if synthetic:
+		rng = np.random.default_rng(0)
+		# Clustered data behaves more like real embeddings than uniform noise
+		centers = rng.normal(size=(max(1, synthetic // 100), dimension)).astype("float32")
+		assignments = rng.integers(0, len(centers), size=synthetic)
+		return centers[assignments] + 0.1 * rng.normal(size=(synthetic, dimension)).astype("float32")
+	vectors_file = Path(index_path) / "vectors.npy"
+	if not vectors_file.exists():
+		raise FileNotFoundError(f"No stored vectors at {vectors_file}; build the index first or pass --synthetic")
+	return np.load(vectors_file)
+
+
+def make_queries(vectors, count: int):
+	rng = np.random.default_rng(1)
+	picks = rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)
+	noise = rng.normal(scale=0.01, size=(len(picks), vectors.shape[1])).astype("float32")
+	return np.ascontiguousarray(vectors[picks] + noise, dtype="float32")
+
+
+def recall_at_k(found, truth, k: int):
+	hits = sum(len(set(row_found[:k]) & set(row_truth[:k])) for row_found, row_truth in zip(found, truth))
+	return hits / (len(truth) * k)
+
+
+def run(index_type: str, vectors, queries, truth, k: int, params):
+	params = dict(params, type=index_type)
+	started = time.perf_counter()
+	index = build_index(vectors, params)
+	build_seconds = time.perf_counter() - started
+	size_mib = faiss.serialize_index(index).nbytes / 1024 / 1024
+
+	latencies = []
+	found = []
+	for query in queries:
+		started = time.perf_counter()
+		_, ids = index.search(query.reshape(1, -1), k)
+		latencies.append((time.perf_counter() - started) * 1000)
+		found.append(ids[0])
+
+	latencies = np.asarray(latencies)
+	print(
+		f"{index_type:<9} build {build_seconds:7.2f}s  size {size_mib:8.1f} MiB  "
+		f"p50 {np.percentile(latencies, 50):7.3f}ms  p95 {np.percentile(latencies, 95):7.3f}ms  "
+		f"recall@{k} {recall_at_k(found, truth, k):.3f}"
+	)
+
+
+def main(args):
+	vectors = np.ascontiguousarray(load_vectors(args.index_path, args.synthetic, args.dimension), dtype="float32")
+	queries = make_queries(vectors, args.queries)
+	print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries")
+
+	flat = faiss.IndexFlatL2(vectors.shape[1])
+	flat.add(vectors)
+	_, truth = flat.search(queries, args.k)
+
+	params = index_params_from_settings(settings)
+	params.update({
+		"hnsw_m": args.hnsw_m,
+		"hnsw_ef_search": args.ef_search,
+		"ivf_nlist": args.nlist,
+		"ivf_nprobe": args.nprobe,
+		"pq_m": args.pq_m,
+	})
+	for index_type in args.types:
+		run(index_type, vectors, queries, truth, args.k, params)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Measure recall@k, latency and size of FAISS index types against the flat baseline")
+	parser.add_argument("--index-path", type=str, default=settings.FAISS_INDEX_PATH, help="Index directory holding vectors.npy")
+	parser.add_argument("--synthetic", type=int, default=0, help="Benchmark N synthetic vectors instead of the stored corpus")
+	parser.add_argument("--dimension", type=int, default=1536, help="Dimension of synthetic vectors")
+	parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES, help="Index types to compare")
+	parser.add_argument("--queries", type=int, default=200, help="Number of queries sampled from the corpus")
+	parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+	parser.add_argument("--hnsw-m", type=int, default=settings.FAISS_HNSW_M)
+	parser.add_argument("--ef-search", type=int, default=settings.FAISS_HNSW_EF_SEARCH)
+	parser.add_argument("--nlist", type=int, default=settings.FAISS_IVF_NLIST)
+	parser.add_argument("--nprobe", type=int, default=settings.FAISS_IVF_NPROBE)
+	parser.add_argument("--pq-m", type=int, default=settings.FAISS_PQ_M)
+	main(parser.parse_args())
@@ -0,0 +1,61 @@
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+from langchain.docstore.document import Document
+
+from app.core.config import settings
+from app.services.ingest import CONTENT_COLUMN_CANDIDATES, iter_csv_documents
+
+
+def legacy_documents(csv_path: Path):
+	# The original ingestion path: whole-file read_csv plus iterrows with per-cell isna checks
+	df = pd.read_csv(csv_path)
+	content_col = next((c for c in CONTENT_COLUMN_CANDIDATES if c in df.columns), None)
+	documents = []
+	for _, row in df.iterrows():
+		content = row.get(content_col)
+		if pd.isna(content) or str(content).strip() == "":
+			continue
+		metadata = {
+			key: ("" if pd.isna(value) else str(value))
+			for key, value in row.items()
+			if not pd.isna(value)
+		}
+		documents.append(Document(page_content=str(content), metadata=metadata))
+	return len(documents)
+
+
+def chunked_documents(csv_path: Path, chunksize: int):
+	count = 0
+	for _ in iter_csv_documents(csv_path, chunksize=chunksize):
+		count += 1
+	return count
+
+
+def measure(label, func, *args):
+	tracemalloc.start()
+	started = time.perf_counter()
+	rows = func(*args)
+	elapsed = time.perf_counter() - started
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(f"{label:<10} {rows:>8} docs  {elapsed:8.3f}s  {rows / elapsed:10.0f} docs/s  peak {peak / 1024 / 1024:8.1f} MiB")
+
+
+def main(csv_path: str, chunksize: int):
+	path = Path(csv_path)
+	if not path.exists():
+		raise FileNotFoundError(f"CSV not found at {csv_path}")
+	measure("iterrows", legacy_documents, path)
+	measure("chunked", chunked_documents, path, chunksize)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compare the legacy iterrows ingestion with chunked CSV ingestion")
+	parser.add_argument("--csv", type=str, default=settings.LINKEDIN_POSTS_CSV_PATH, help="Path to the posts CSV")
+	parser.add_argument("--chunksize", type=int, default=settings.INGEST_CHUNK_SIZE, help="Rows per read_csv chunk")
+	args = parser.parse_args()
+	main(args.csv, args.chunksize)
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import numpy as np
+
+
+def parse_server_timing(header: str):
+	stages = {}
+	for entry in header.split(","):
+		name, _, params = entry.strip().partition(";")
+		if name and params.startswith("dur="):
+			stages[name] = float(params[len("dur="):]) / 1000
+	return stages
+
+
+async def generate(client: httpx.AsyncClient, payload):
+	# Server-side stage timings come back in the Server-Timing header
+	started = time.perf_counter()
+	response = await client.post("/generate_post", json=payload)
+	elapsed = time.perf_counter() - started
+	return response.status_code == 200, elapsed, parse_server_timing(response.headers.get("server-timing", ""))
+
+
+async def generate_stream(client: httpx.AsyncClient, payload):
+	# Stage boundaries come from the SSE events: meta (retrieval done), first token, last token, done (posts saved)
+	started = time.perf_counter()
+	marks = {}
+	event = None
+	ok = False
+	async with client.stream("POST", "/generate_post/stream", json=payload) as response:
+		if response.status_code != 200:
+			return False, time.perf_counter() - started, {}
+		async for line in response.aiter_lines():
+			if line.startswith("event:"):
+				event = line[len("event:"):].strip()
+			elif line.startswith("data:"):
+				now = time.perf_counter() - started
+				if event == "meta":
+					marks["meta"] = now
+				elif event == "token":
+					marks.setdefault("first_token", now)
+					marks["last_token"] = now
+				elif event == "done":
+					marks["done"] = now
+					ok = True
+				elif event == "error":
+					ok = False
+	elapsed = time.perf_counter() - started
+	stages = {}
+	if ok and "meta" in marks and "first_token" in marks:
+		stages = {
+			"retrieval": marks["meta"],
+			"first_token": marks["first_token"] - marks["meta"],
+			"generation": marks["last_token"] - marks["first_token"],
+			"persist": marks["done"] - marks["last_token"],
+		}
+	return ok, elapsed, stages
+
+
+async def run_level(base_url: str, concurrency: int, requests: int, query: str, users: int, stream: bool, timeout: float):
+	queue = asyncio.Queue()
+	for number in range(requests):
+		queue.put_nowait(number)
+	latencies = []
+	stage_samples = {}
+	failures = 0
+	call = generate_stream if stream else generate
+
+	async def worker(client):
+		nonlocal failures
+		while True:
+			try:
+				number = queue.get_nowait()
+			except asyncio.QueueEmpty:
+				return
+			payload = {"user_id": f"bench-user-{number % users}", "query": query}
+			try:
+				ok, elapsed, stages = await call(client, payload)
+			except httpx.HTTPError as exc:
+				print(f"Request {number} failed: {exc}")
+				ok, elapsed, stages = False, 0.0, {}
+			if not ok:
+				failures += 1
+				continue
+			latencies.append(elapsed)
+			for stage, seconds in stages.items():
+				stage_samples.setdefault(stage, []).append(seconds)
+
+	limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+	async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+		started = time.perf_counter()
+		await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+		wall = time.perf_counter() - started
+	return latencies, stage_samples, failures, wall
+
+
+def percentiles_ms(samples):
+	if not samples:
+		return "       -        -        -"
+	p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+	return f"{p50:8.0f} {p95:8.0f} {p99:8.0f}"
+
+
+async def main(args):
+	levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+	async with httpx.AsyncClient(base_url=args.url, timeout=10) as client:
+		ready = await client.get("/readyz")
+		if ready.status_code != 200:
+			print(f"Warning: {args.url}/readyz returned {ready.status_code}; retrieval may be skipped while the index loads.")
+
+	mode = "stream" if args.stream else "generate"
+	print(f"{mode} x {args.requests} requests per level against {args.url}")
+	print(f"{'conc':>4} {'ok':>5} {'fail':>5} {'req/s':>7}  {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+	for concurrency in levels:
+		latencies, stage_samples, failures, wall = await run_level(
+			args.url, concurrency, args.requests, args.query, args.users, args.stream, args.timeout
+		)
+		rps = len(latencies) / wall if wall else 0.0
+		print(f"{concurrency:>4} {len(latencies):>5} {failures:>5} {rps:7.2f}  {percentiles_ms(latencies)}")
+		for stage, samples in stage_samples.items():
+			print(f"{'':>4} {stage:>17}        {percentiles_ms(samples)}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Drive /generate_post at fixed concurrency levels and report latency percentiles and throughput. "
+		"Run the API against app.tools.stub_openai for a repeatable, cost-free baseline."
+	)
+	parser.add_argument("--url", type=str, default="http://127.0.0.1:8000", help="Base URL of the running API")
+	parser.add_argument("--concurrency", type=str, default="1,4,16", help="Comma-separated concurrency levels")
+	parser.add_argument("--requests", type=int, default=50, help="Requests per concurrency level")
+	parser.add_argument("--query", type=str, default="Lessons from scaling a remote engineering team")
+	parser.add_argument("--users", type=int, default=20, help="Distinct user ids to rotate through")
+	parser.add_argument("--stream", action="store_true", help="Use /generate_post/stream and time stages from the SSE events")
+	parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+	asyncio.run(main(parser.parse_args()))
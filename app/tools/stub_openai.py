@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FILLER_WORDS = (
+	"growth team customers learned lesson build trust clarity focus leaders hiring product market story "
+	"results feedback habit career momentum simple honest practice week decision value"
+).split()
+
+
+def estimate_tokens(text: str) -> int:
+	return max(1, len(text) // 4)
+
+
+def fake_embedding(key: str, dimension: int) -> np.ndarray:
+	# Deterministic per input so cache hits and index searches behave consistently across runs
+	seed = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+	vector = np.random.default_rng(seed).standard_normal(dimension).astype("float32")
+	return vector / np.linalg.norm(vector)
+
+
+def create_app(
+	latency_ms: float = 300.0,
+	jitter_ms: float = 100.0,
+	embedding_latency_ms: float = 50.0,
+	tokens_per_second: float = 80.0,
+	completion_tokens: int = 180,
+	error_rate: float = 0.0,
+	retry_after_ms: int = 500,
+	dimension: int = 1536,
+	seed: int = 0,
+) -> FastAPI:
+	"""Build an app that answers the Azure OpenAI chat-completions and embeddings routes locally."""
+	app = FastAPI(title="Azure OpenAI stub")
+	rng = random.Random(seed)
+	stats = {"chat": 0, "embeddings": 0, "throttled": 0, "completion_tokens": 0}
+
+	async def sleep_latency(base_ms: float):
+		await asyncio.sleep(max(0.0, base_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+	def throttled():
+		if error_rate <= 0 or rng.random() >= error_rate:
+			return None
+		stats["throttled"] += 1
+		return JSONResponse(
+			status_code=429,
+			headers={"retry-after": str(max(1, round(retry_after_ms / 1000))), "retry-after-ms": str(retry_after_ms)},
+			content={"error": {"code": "429", "message": "Requests to this deployment have exceeded the stub rate limit."}},
+		)
+
+	def completion_words(count: int):
+		return [rng.choice(FILLER_WORDS) for _ in range(count)]
+
+	@app.post("/openai/deployments/{deployment}/chat/completions")
+	async def chat_completions(deployment: str, request: Request):
+		body = await request.json()
+		stats["chat"] += 1
+		error = throttled()
+		if error is not None:
+			return error
+
+		choices = max(1, int(body.get("n") or 1))
+		max_tokens = body.get("max_tokens") or completion_tokens
+		length = max(1, min(completion_tokens, int(max_tokens)))
+		prompt_tokens = sum(estimate_tokens(str(message.get("content") or "")) for message in body.get("messages", []))
+		completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+		created = int(time.time())
+		texts = [completion_words(length) for _ in range(choices)]
+		stats["completion_tokens"] += length * choices
+
+		if body.get("stream"):
+			async def event_stream():
+				await sleep_latency(latency_ms)
+				for position in range(length):
+					for index, words in enumerate(texts):
+						chunk = {
+							"id": completion_id,
+							"object": "chat.completion.chunk",
+							"created": created,
+							"model": deployment,
+							"choices": [{"index": index, "delta": {"content": (" " if position else "") + words[position]}, "finish_reason": None}],
+						}
+						yield f"data: {json.dumps(chunk)}\n\n"
+					await asyncio.sleep(1 / tokens_per_second)
+				for index in range(choices):
+					chunk = {
+						"id": completion_id,
+						"object": "chat.completion.chunk",
+						"created": created,
+						"model": deployment,
+						"choices": [{"index": index, "delta": {}, "finish_reason": "stop"}],
+					}
+					yield f"data: {json.dumps(chunk)}\n\n"
+				yield "data: [DONE]\n\n"
+
+			return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+		# Choices decode in parallel, so generation time follows the length of one choice
+		await sleep_latency(latency_ms)
+		await asyncio.sleep(length / tokens_per_second)
+		return {
+			"id": completion_id,
+			"object": "chat.completion",
+			"created": created,
+			"model": deployment,
+			"choices": [
+				{"index": index, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}
+				for index, words in enumerate(texts)
+			],
+			"usage": {
+				"prompt_tokens": prompt_tokens,
+				"completion_tokens": length * choices,
+				"total_tokens": prompt_tokens + length * choices,
+			},
+		}
+
+	@app.post("/openai/deployments/{deployment}/embeddings")
+	async def embeddings(deployment: str, request: Request):
+		body = await request.json()
+		stats["embeddings"] += 1
+		error = throttled()
+		if error is not None:
+			return error
+
+		inputs = body.get("input")
+		if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+			inputs = [inputs]
+		await sleep_latency(embedding_latency_ms)
+
+		data = []
+		prompt_tokens = 0
+		for index, item in enumerate(inputs or []):
+			# Clients may send pre-tokenised input as lists of token ids
+			key = item if isinstance(item, str) else json.dumps(item)
+			prompt_tokens += estimate_tokens(item) if isinstance(item, str) else len(item)
+			vector = fake_embedding(key, dimension)
+			if body.get("encoding_format") == "base64":
+				embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+			else:
+				embedding = vector.tolist()
+			data.append({"object": "embedding", "index": index, "embedding": embedding})
+		return {
+			"object": "list",
+			"data": data,
+			"model": deployment,
+			"usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+		}
+
+	@app.get("/stats")
+	async def get_stats():
+		return stats
+
+	return app
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Serve a local stand-in for the Azure OpenAI chat and embeddings endpoints. "
+		"Point AZURE_OPENAI_ENDPOINT at it (any API key works) to benchmark without Azure costs."
+	)
+	parser.add_argument("--host", type=str, default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8100)
+	parser.add_argument("--latency-ms", type=float, default=300.0, help="Chat time to first token")
+	parser.add_argument("--jitter-ms", type=float, default=100.0, help="Uniform +/- jitter added to every latency")
+	parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Embedding request latency")
+	parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Completion decode rate per choice")
+	parser.add_argument("--completion-tokens", type=int, default=180, help="Tokens generated per choice")
+	parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+	parser.add_argument("--retry-after-ms", type=int, default=500, help="Retry hint sent with 429 responses")
+	parser.add_argument("--dimension", type=int, default=1536, help="Embedding dimension")
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	stub = create_app(
+		latency_ms=args.latency_ms,
+		jitter_ms=args.jitter_ms,
+		embedding_latency_ms=args.embedding_latency_ms,
+		tokens_per_second=args.tokens_per_second,
+		completion_tokens=args.completion_tokens,
+		error_rate=args.error_rate,
+		retry_after_ms=args.retry_after_ms,
+		dimension=args.dimension,
+		seed=args.seed,
+	)
+	uvicorn.run(stub, host=args.host, port=args.port, log_level="warning")
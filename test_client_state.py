@@ -0,0 +1,301 @@
+"""
+Unit tests for the in-process client state store:
+1. LRU / size / TTL eviction
+2. History trimming and per-client selections
+3. Refreshing clients from the backend
+4. Retrying failed flushes and writing evicted changes through
+5. Round-tripping state through the database backend
+"""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+import testing_support  # noqa: F401  (Azure settings defaults)
+
+from sqlalchemy.orm import sessionmaker
+
+from app.db import models
+from app.db.database import create_db_engine
+from app.services.client_state import (
+    ClientState,
+    ClientStateBackend,
+    ClientStateStore,
+    DatabaseClientStateBackend,
+    InteractionRecord,
+)
+
+
+def make_record(topic="remote work", response="A post."):
+    return InteractionRecord(query="q", topic=topic, hook="h", framework="f", cta="c", response=response)
+
+
+class MemoryBackend(ClientStateBackend):
+    """Backend that keeps saved snapshots in memory and can be told to fail."""
+
+    def __init__(self):
+        self.rows = {}
+        self.saved = []
+        self.loads = 0
+        self.last_loads = 0
+        self.fail_saves = 0
+        self.load_delay = 0.0
+
+    def load(self, client_id, history_limit):
+        self.loads += 1
+        if self.load_delay:
+            time.sleep(self.load_delay)
+        row = self.rows.get(client_id)
+        if row is None:
+            return None
+        state = ClientState()
+        state.hook = row["hook"]
+        state.history = list(row["records"])[-history_limit:]
+        return state
+
+    def load_last(self, client_id):
+        self.last_loads += 1
+        row = self.rows.get(client_id)
+        if row is None:
+            return None
+        return {"hook": row["hook"], "framework": None, "cta": None, "topic": None}
+
+    def save(self, snapshots):
+        if self.fail_saves:
+            self.fail_saves -= 1
+            raise RuntimeError("database unavailable")
+        for snapshot in snapshots:
+            row = self.rows.setdefault(snapshot["client_id"], {"hook": None, "records": []})
+            row["hook"] = snapshot["hook"]
+            row["records"].extend(snapshot["records"])
+        self.saved.append(snapshots)
+
+
+class ClientStateEvictionTest(unittest.TestCase):
+
+    def test_least_recently_used_client_is_evicted(self):
+        store = ClientStateStore(max_clients=2)
+        store.append("a", make_record())
+        store.append("b", make_record())
+        store.history("a")
+        store.append("c", make_record())
+
+        self.assertEqual(len(store.history("a")), 1)
+        self.assertEqual(store.history("b"), [])
+        self.assertEqual(len(store.history("c")), 1)
+        self.assertEqual(store.stats()["evictions"], 1)
+
+    def test_history_is_trimmed_to_limit(self):
+        store = ClientStateStore(history_limit=3)
+        for index in range(5):
+            store.append("a", make_record(response=f"post {index}"))
+        self.assertEqual([record.response for record in store.history("a")], ["post 2", "post 3", "post 4"])
+
+    def test_byte_budget_evicts_older_clients(self):
+        store = ClientStateStore(max_bytes=1)
+        store.append("a", make_record())
+        store.append("b", make_record())
+        # The client just written is kept even when it alone exceeds the budget
+        self.assertEqual(store.stats()["clients"], 1)
+        self.assertEqual(len(store.history("b")), 1)
+
+    def test_idle_clients_expire(self):
+        store = ClientStateStore(ttl_seconds=60)
+        store.append("a", make_record())
+        store._clients["a"].last_seen -= 120
+        self.assertEqual(store.history("a"), [])
+        self.assertEqual(store.stats()["clients"], 0)
+
+    def test_update_last_returns_previous_and_chosen(self):
+        store = ClientStateStore()
+        store.set_last("a", "hook", "first")
+        previous, chosen = store.update_last("a", "hook", lambda last: last + " again")
+        self.assertEqual((previous, chosen), ("first", "first again"))
+        self.assertEqual(store.get_last("a", "hook"), "first again")
+        with self.assertRaises(ValueError):
+            store.set_last("a", "unknown", "x")
+
+
+class ClientStateBackendTest(unittest.TestCase):
+
+    def make_store(self, backend, **kwargs):
+        kwargs.setdefault("flush_interval", 0)
+        store = ClientStateStore(backend=backend, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_flush_writes_pending_records_once(self):
+        backend = MemoryBackend()
+        store = self.make_store(backend)
+        store.append("a", make_record())
+        store.flush()
+        store.flush()
+
+        self.assertEqual(len(backend.saved), 1)
+        self.assertEqual(len(backend.rows["a"]["records"]), 1)
+        self.assertEqual(store.stats()["dirty_clients"], 0)
+
+    def test_failed_flush_is_retried(self):
+        backend = MemoryBackend()
+        backend.fail_saves = 1
+        store = self.make_store(backend)
+        store.append("a", make_record(response="first"))
+        store.flush()
+        self.assertNotIn("a", backend.rows)
+        self.assertEqual(store.stats()["dirty_clients"], 1)
+
+        store.append("a", make_record(response="second"))
+        store.flush()
+        self.assertEqual([record.response for record in backend.rows["a"]["records"]], ["first", "second"])
+        self.assertEqual(store.stats()["dirty_clients"], 0)
+
+    def test_dirty_client_is_written_through_on_eviction(self):
+        backend = MemoryBackend()
+        store = self.make_store(backend, max_clients=1)
+        store.append("a", make_record(response="unsaved"))
+        store.append("b", make_record())
+
+        # "a" was evicted before any flush; its record must not be lost
+        self.assertEqual([record.response for record in backend.rows["a"]["records"]], ["unsaved"])
+        self.assertEqual(store.stats()["evicted_pending"], 0)
+        self.assertEqual([record.response for record in store.history("a")], ["unsaved"])
+
+    def test_failed_eviction_write_is_kept_for_next_flush(self):
+        backend = MemoryBackend()
+        # The evicting call writes through twice: after its refresh and after its update
+        backend.fail_saves = 2
+        store = self.make_store(backend, max_clients=1)
+        store.append("a", make_record())
+        store.append("b", make_record())
+        self.assertEqual(store.stats()["evicted_pending"], 1)
+
+        store.flush()
+        self.assertEqual(store.stats()["evicted_pending"], 0)
+        self.assertEqual(len(backend.rows["a"]["records"]), 1)
+
+    def test_clean_client_is_refreshed_from_backend(self):
+        backend = MemoryBackend()
+        store = self.make_store(backend, refresh_seconds=60)
+        store.set_last("a", "hook", "mine")
+        store.flush()
+
+        # Another worker moves the client on
+        backend.rows["a"]["hook"] = "theirs"
+        self.assertEqual(store.get_last("a", "hook"), "mine")
+        store._clients["a"].loaded_at -= 120
+        self.assertEqual(store.get_last("a", "hook"), "theirs")
+
+    def test_stale_client_rereads_only_last_selections(self):
+        backend = MemoryBackend()
+        store = self.make_store(backend, refresh_seconds=60, history_refresh_seconds=3600)
+        store.append("a", make_record(response="mine"))
+        store.flush()
+
+        # Another worker adds an interaction and moves the hook on
+        backend.rows["a"]["records"].append(make_record(response="theirs"))
+        backend.rows["a"]["hook"] = "theirs"
+        store._clients["a"].loaded_at -= 120
+        self.assertEqual(store.get_last("a", "hook"), "theirs")
+        self.assertEqual([record.response for record in store.history("a")], ["mine"])
+        self.assertEqual((backend.loads, backend.last_loads), (1, 1))
+        self.assertEqual(store.stats()["bytes"], store._clients["a"].size)
+
+    def test_history_is_reloaded_after_its_interval(self):
+        backend = MemoryBackend()
+        store = self.make_store(backend, refresh_seconds=60, history_refresh_seconds=3600)
+        store.append("a", make_record(response="mine"))
+        store.flush()
+
+        backend.rows["a"]["records"].append(make_record(response="theirs"))
+        store._clients["a"].history_loaded_at -= 7200
+        self.assertEqual([record.response for record in store.history("a")], ["mine", "theirs"])
+        self.assertEqual((backend.loads, backend.last_loads), (2, 0))
+
+    def test_dirty_client_is_not_overwritten_by_refresh(self):
+        backend = MemoryBackend()
+        backend.rows["a"] = {"hook": "theirs", "records": []}
+        store = self.make_store(backend, refresh_seconds=0)
+        store.set_last("a", "hook", "mine")
+        self.assertEqual(store.get_last("a", "hook"), "mine")
+
+    def test_unknown_client_is_loaded_once(self):
+        backend = MemoryBackend()
+        store = self.make_store(backend, refresh_seconds=60)
+        for _ in range(3):
+            self.assertEqual(store.history("a"), [])
+        self.assertEqual(backend.loads, 1)
+
+    def test_concurrent_readers_share_one_load(self):
+        backend = MemoryBackend()
+        backend.load_delay = 0.2
+        store = self.make_store(backend, refresh_seconds=60)
+        threads = [threading.Thread(target=store.history, args=("a",)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(backend.loads, 1)
+
+    def test_backend_load_runs_without_store_lock(self):
+        store = None
+
+        class LockCheckingBackend(MemoryBackend):
+            def load(self, client_id, history_limit):
+                # The store lock is re-entrant, so probe it from another thread
+                result = []
+
+                def probe():
+                    acquired = store._lock.acquire(blocking=False)
+                    if acquired:
+                        store._lock.release()
+                    result.append(acquired)
+
+                prober = threading.Thread(target=probe)
+                prober.start()
+                prober.join()
+                self.lock_free = result[0]
+                return super().load(client_id, history_limit)
+
+        backend = LockCheckingBackend()
+        store = self.make_store(backend)
+        store.history("a")
+        self.assertTrue(backend.lock_free)
+
+
+class DatabaseClientStateBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        engine = create_db_engine(f"sqlite:///{directory}/test.db")
+        self.addCleanup(engine.dispose)
+        models.Base.metadata.create_all(bind=engine)
+        self.backend = DatabaseClientStateBackend(sessionmaker(bind=engine), history_limit=2)
+
+    def save(self, responses, hook="h"):
+        state = ClientState()
+        state.hook = hook
+        state.pending = [make_record(response=response) for response in responses]
+        self.backend.save([state.snapshot("a")])
+
+    def test_state_round_trips_and_history_is_trimmed(self):
+        self.save(["one", "two"])
+        self.save(["three"], hook="newer")
+        state = self.backend.load("a", history_limit=5)
+        self.assertEqual([record.response for record in state.history], ["two", "three"])
+        self.assertEqual(state.hook, "newer")
+
+    def test_load_last_reads_only_selections(self):
+        self.assertIsNone(self.backend.load_last("a"))
+        self.save(["one"], hook="newer")
+        self.assertEqual(self.backend.load_last("a"), {"hook": "newer", "framework": None, "cta": None, "topic": None})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Unit tests for the database layer against a throwaway SQLite file:
+1. Async user creation when a concurrent request wins the insert
+2. Saving a request's drafts and bumping the user's post count
+"""
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+import testing_support  # noqa: F401  (Azure settings defaults)
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.db import crud, models
+from app.db.database import Base, create_async_db_engine, create_db_engine
+
+
+class AsyncCrudTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        url = f"sqlite:///{directory}/test.db"
+        sync_engine = create_db_engine(url)
+        Base.metadata.create_all(bind=sync_engine)
+        sync_engine.dispose()
+
+        self.engine = create_async_db_engine(url)
+        self.sessions = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_missing_user_is_created(self):
+        async with self.sessions() as db:
+            user = await crud.aget_or_create_user(db, "ada")
+            self.assertEqual(user.post_count, 0)
+        async with self.sessions() as db:
+            self.assertIsNotNone(await crud.aget_user(db, "ada"))
+
+    async def test_concurrently_created_user_is_returned(self):
+        async with self.sessions() as db:
+            await crud.acreate_user(db, "ada")
+
+        real_get_user = crud.aget_user
+        calls = []
+
+        async def stale_get_user(db, user_id):
+            # The first lookup runs before the other request's insert is visible
+            calls.append(user_id)
+            if len(calls) == 1:
+                return None
+            return await real_get_user(db, user_id)
+
+        async with self.sessions() as db:
+            with mock.patch.object(crud, "aget_user", stale_get_user):
+                user = await crud.aget_or_create_user(db, "ada")
+        self.assertEqual(user.user_id, "ada")
+        self.assertEqual(len(calls), 2)
+
+    async def test_async_save_posts_bumps_post_count(self):
+        async with self.sessions() as db:
+            await crud.acreate_user(db, "ada")
+            post_ids = await crud.asave_posts(db, "ada", "q", ["one", "two"])
+        async with self.sessions() as db:
+            user = await db.get(models.User, "ada")
+            self.assertEqual(user.post_count, 2)
+            self.assertIsNotNone(await db.get(models.Post, post_ids[1]))
+
+
+class SavePostsTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        engine = create_db_engine(f"sqlite:///{directory}/test.db")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        self.addCleanup(self.db.close)
+
+    def post_count(self, user_id):
+        self.db.expire_all()
+        return crud.get_user(self.db, user_id).post_count
+
+    def test_drafts_are_saved_and_counted(self):
+        crud.create_user(self.db, "ada")
+        post_ids = crud.save_posts(self.db, "ada", "q", ["one", "two", "three"])
+        self.assertEqual(len(set(post_ids)), 3)
+        self.assertEqual(self.db.query(models.Post).filter(models.Post.user_id == "ada").count(), 3)
+        self.assertEqual(self.post_count("ada"), 3)
+
+        crud.save_post(self.db, "ada", "q", "four")
+        self.assertEqual(self.post_count("ada"), 4)
+
+    def test_missing_count_starts_from_zero(self):
+        self.db.add(models.User(user_id="ada", post_count=None))
+        self.db.commit()
+        crud.save_posts(self.db, "ada", "q", ["one", "two"])
+        self.assertEqual(self.post_count("ada"), 2)
+
+    def test_no_drafts_writes_nothing(self):
+        crud.create_user(self.db, "ada")
+        self.assertEqual(crud.save_posts(self.db, "ada", "q", []), [])
+        self.assertEqual(self.db.query(models.Post).count(), 0)
+        self.assertEqual(self.post_count("ada"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
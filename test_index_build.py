@@ -0,0 +1,435 @@
+"""
+Unit tests for building and updating the on-disk index without Azure:
+1. Incremental updates that embed only new rows and drop removed ones
+2. Resuming embedding batches from checkpoints
+3. Streaming documents out of the posts CSV
+4. The memory-mapped docstore and its id lookup
+5. Building each FAISS index type and searching a subset of it
+6. Retrying a failed background load
+7. Embedding queries under the retrieval deadline
+"""
+import csv
+import hashlib
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+from testing_support import TempDirTestCase
+
+from app.core.config import settings
+from app.services.docstore import IdLookup, MmapDocstore, PositionIndex, docstore_exists, write_docstore
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.faiss_index import INDEX_TYPES, build_index, build_signature, search_subset
+from app.services.ingest import iter_csv_documents, row_hash
+from app.services.vector_store import VECTORS_FILENAME, VectorStoreService
+
+DIMENSION = 8
+
+POSTS = [
+    "Hiring a remote team taught me that clear written updates beat long meetings every single week.",
+    "Pricing experiments failed until we started talking to churned customers before changing anything.",
+    "My best career move was asking for feedback on the work I was proudest of, not the work I doubted.",
+    "Founders underestimate how much a boring, reliable onboarding email sequence does for retention numbers.",
+]
+
+
+def fake_vector(text):
+    # Deterministic per text, so a stored vector can be checked against its document
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [byte / 255 for byte in digest[:DIMENSION]]
+
+
+class FakeEmbeddings:
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [fake_vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return fake_vector(text)
+
+
+def write_posts_csv(path, posts):
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["profile_name", "profile_url", "post_content", "post_date"])
+        for post in posts:
+            # Rows are identified by their content, so keep each post's metadata fixed
+            number = POSTS.index(post)
+            writer.writerow([f"Author {number}", f"https://x/{number}", post, "2024-01-01"])
+
+
+def make_service(directory, embeddings):
+    with mock.patch.object(settings, "EMBEDDING_CACHE_ENABLED", False), \
+            mock.patch("app.services.vector_store.AzureOpenAIEmbeddings", return_value=embeddings):
+        service = VectorStoreService(eager_load=False)
+    service.index_dir = directory / "index"
+    service.dataset_path = directory / "posts.csv"
+    return service
+
+
+class IncrementalUpdateTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.csv_path = self.directory / "posts.csv"
+        self.embeddings = FakeEmbeddings()
+        self.service = make_service(self.directory, self.embeddings)
+
+    def build(self, posts):
+        write_posts_csv(self.csv_path, posts)
+        self.embeddings.embedded.clear()
+        return self.service.load_posts_from_csv(self.csv_path)
+
+    def stored_texts(self):
+        return [document.page_content for _, document in MmapDocstore(self.service.index_dir).iter_documents()]
+
+    def assert_vectors_match_documents(self):
+        vectors = np.load(self.service.index_dir / VECTORS_FILENAME)
+        texts = self.stored_texts()
+        self.assertEqual(len(vectors), len(texts))
+        for vector, text in zip(vectors, texts):
+            np.testing.assert_allclose(vector, fake_vector(text), rtol=1e-6)
+
+    def test_update_embeds_only_new_rows_and_drops_removed_ones(self):
+        self.build(POSTS[:3])
+        self.assertEqual(sorted(self.embeddings.embedded), sorted(POSTS[:3]))
+
+        store = self.build(POSTS[1:])
+        self.assertEqual(self.embeddings.embedded, [POSTS[3]])
+        self.assertEqual(sorted(self.stored_texts()), sorted(POSTS[1:]))
+        self.assertEqual(store.index.ntotal, 3)
+        self.assert_vectors_match_documents()
+
+    def test_unchanged_csv_embeds_nothing(self):
+        self.build(POSTS)
+        self.build(POSTS)
+        self.assertEqual(self.embeddings.embedded, [])
+        self.assertEqual(sorted(self.stored_texts()), sorted(POSTS))
+        self.assert_vectors_match_documents()
+
+    def test_crash_while_swapping_files_in_forces_a_rebuild(self):
+        self.build(POSTS[:3])
+        # New vectors and ANN index are live, but the docstore swap never happens
+        with mock.patch("app.services.vector_store.commit_docstore", side_effect=OSError("crashed")):
+            with self.assertRaises(OSError):
+                self.build(POSTS[1:])
+        self.assertFalse(self.service._index_exists())
+
+        self.build(POSTS[1:])
+        self.assertEqual(sorted(self.embeddings.embedded), sorted(POSTS[1:]))
+        self.assert_vectors_match_documents()
+
+    def test_changed_embedding_deployment_rebuilds(self):
+        self.build(POSTS[:2])
+        with mock.patch.object(settings, "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME", "other"):
+            self.build(POSTS[:2])
+        self.assertEqual(sorted(self.embeddings.embedded), sorted(POSTS[:2]))
+
+
+class EmbeddingPipelineTest(TempDirTestCase):
+
+    ids = [f"row-{number}" for number in range(len(POSTS))]
+
+    def make_pipeline(self, embeddings):
+        return EmbeddingPipeline(embeddings, batch_size=2, max_workers=2, checkpoint_dir=self.directory / "checkpoints")
+
+    def test_vectors_keep_input_order(self):
+        pipeline = EmbeddingPipeline(FakeEmbeddings(), batch_size=1, max_workers=4)
+        vectors = pipeline.embed(self.ids, POSTS)
+        np.testing.assert_allclose(vectors, [fake_vector(post) for post in POSTS], rtol=1e-6)
+
+    def test_finished_batches_are_resumed_from_checkpoints(self):
+        self.make_pipeline(FakeEmbeddings()).embed(self.ids, POSTS)
+
+        embeddings = FakeEmbeddings()
+        pipeline = self.make_pipeline(embeddings)
+        vectors = pipeline.embed(self.ids, POSTS)
+        self.assertEqual(embeddings.embedded, [])
+        self.assertEqual(pipeline.last_report["resumed_batches"], 2)
+        np.testing.assert_allclose(vectors, [fake_vector(post) for post in POSTS], rtol=1e-6)
+
+    def test_unreadable_checkpoint_is_embedded_again(self):
+        self.make_pipeline(FakeEmbeddings()).embed(self.ids, POSTS)
+        checkpoint = self.directory / "checkpoints" / f"{EmbeddingPipeline._batch_key(self.ids[:2])}.npy"
+        checkpoint.write_bytes(b"truncated")
+
+        embeddings = FakeEmbeddings()
+        pipeline = self.make_pipeline(embeddings)
+        vectors = pipeline.embed(self.ids, POSTS)
+        self.assertEqual(embeddings.embedded, POSTS[:2])
+        self.assertEqual(pipeline.last_report["resumed_batches"], 1)
+        np.testing.assert_allclose(vectors, [fake_vector(post) for post in POSTS], rtol=1e-6)
+        # The batch was checkpointed again, so a third run resumes everything
+        self.assertEqual(len(np.load(checkpoint)), 2)
+
+    def test_checkpoint_with_wrong_shape_is_ignored(self):
+        checkpoint_dir = self.directory / "checkpoints"
+        checkpoint_dir.mkdir()
+        np.save(checkpoint_dir / f"{EmbeddingPipeline._batch_key(self.ids[:2])}.npy", np.zeros((3, DIMENSION)))
+
+        embeddings = FakeEmbeddings()
+        self.make_pipeline(embeddings).embed(self.ids[:2], POSTS[:2])
+        self.assertEqual(embeddings.embedded, POSTS[:2])
+
+    def test_clear_checkpoints_removes_directory(self):
+        pipeline = self.make_pipeline(FakeEmbeddings())
+        pipeline.embed(self.ids, POSTS)
+        pipeline.clear_checkpoints()
+        self.assertFalse((self.directory / "checkpoints").exists())
+
+
+class CsvIngestTest(TempDirTestCase):
+
+    def write_csv(self, text):
+        path = self.directory / "posts.csv"
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def test_rows_without_content_are_skipped(self):
+        path = self.write_csv(
+            "profile_name,post_content,post_date\n"
+            "Ada,First post,2024-01-01\n"
+            "Grace,,2024-01-02\n"
+            "Alan,   ,2024-01-03\n"
+            "Linus,Second post,\n"
+        )
+        for chunksize in (1, 2, 5000):
+            documents = [document for _, document in iter_csv_documents(path, chunksize=chunksize)]
+            self.assertEqual([document.page_content for document in documents], ["First post", "Second post"])
+
+    def test_metadata_holds_present_cells_as_strings(self):
+        path = self.write_csv("profile_name,post_content,post_date,likes\nAda,First post,,0042\n")
+        [(doc_id, document)] = list(iter_csv_documents(path))
+        expected = {"profile_name": "Ada", "post_content": "First post", "likes": "0042"}
+        self.assertEqual(document.metadata, expected)
+        self.assertEqual(doc_id, row_hash(expected))
+
+    def test_other_content_column_names_are_accepted(self):
+        path = self.write_csv("author,text\nAda,A post\n")
+        self.assertEqual([document.page_content for _, document in iter_csv_documents(path)], ["A post"])
+
+    def test_missing_content_column_raises(self):
+        path = self.write_csv("author,headline\nAda,A post\n")
+        with self.assertRaises(ValueError):
+            list(iter_csv_documents(path))
+
+    def test_identical_rows_share_an_id(self):
+        path = self.write_csv("profile_name,post_content\nAda,Same post\nAda,Same post\nGrace,Same post\n")
+        ids = [doc_id for doc_id, _ in iter_csv_documents(path)]
+        self.assertEqual(ids[0], ids[1])
+        self.assertNotEqual(ids[0], ids[2])
+
+
+class MmapDocstoreTest(TempDirTestCase):
+
+    rows = [
+        ("id-b", Document(page_content="Première publication ✨", metadata={"profile_name": "Ada", "post_date": "2024-01-01"})),
+        ("id-a", Document(page_content="", metadata={})),
+        ("id-c", Document(page_content="Third post", metadata={"profile_url": "https://x/c"})),
+    ]
+
+    def test_documents_round_trip_in_order(self):
+        self.assertEqual(write_docstore(self.directory, iter(self.rows)), 3)
+        self.assertTrue(docstore_exists(self.directory))
+
+        docstore = MmapDocstore(self.directory)
+        self.assertEqual(len(docstore), 3)
+        self.assertEqual(list(docstore.iter_documents()), self.rows)
+        self.assertEqual(docstore.metadata(2), {"profile_url": "https://x/c"})
+        self.assertEqual(docstore.search("0"), self.rows[0][1])
+        self.assertEqual(docstore.search(3), "ID 3 not found.")
+
+    def test_empty_docstore_can_be_opened(self):
+        self.assertEqual(write_docstore(self.directory, []), 0)
+        docstore = MmapDocstore(self.directory)
+        self.assertEqual(len(docstore), 0)
+        self.assertIsNone(IdLookup(docstore.ids()).get("id-a"))
+
+    def test_rewrite_replaces_previous_files(self):
+        write_docstore(self.directory, self.rows)
+        write_docstore(self.directory, self.rows[2:])
+        docstore = MmapDocstore(self.directory)
+        self.assertEqual(list(docstore.iter_documents()), self.rows[2:])
+        self.assertEqual(list(self.directory.glob("*.tmp")), [])
+
+    def test_id_lookup_resolves_positions(self):
+        write_docstore(self.directory, self.rows)
+        lookup = IdLookup(MmapDocstore(self.directory).ids())
+        self.assertEqual([lookup.get(doc_id) for doc_id, _ in self.rows], [0, 1, 2])
+        self.assertIsNone(lookup.get("id-z"))
+        self.assertIsNone(lookup.get("id-0"))
+
+    def test_position_index_covers_every_position(self):
+        positions = PositionIndex(3)
+        self.assertEqual(list(positions), [0, 1, 2])
+        self.assertEqual(positions[2], 2)
+        with self.assertRaises(KeyError):
+            positions[3]
+
+
+def index_params(index_type, **overrides):
+    params = {
+        "type": index_type,
+        "hnsw_m": 8,
+        "hnsw_ef_construction": 40,
+        "hnsw_ef_search": 32,
+        "ivf_nlist": 4,
+        "ivf_nprobe": 4,
+        "pq_m": 4,
+        "pq_nbits": 4,
+    }
+    params.update(overrides)
+    return params
+
+
+class FaissIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vectors = np.random.default_rng(7).random((400, 16), dtype=np.float32)
+
+    def test_every_index_type_finds_stored_vectors(self):
+        for index_type in INDEX_TYPES:
+            with self.subTest(index_type=index_type):
+                index = build_index(self.vectors, index_params(index_type))
+                self.assertEqual(index.ntotal, len(self.vectors))
+                _, hits = index.search(self.vectors[:20], 5)
+                found = sum(position in row for position, row in enumerate(hits))
+                # IVF-PQ is lossy; the exact and graph indexes should all find themselves
+                self.assertGreaterEqual(found, 15 if index_type == "ivf_pq" else 20)
+
+    def test_search_params_are_applied(self):
+        hnsw = build_index(self.vectors, index_params("hnsw", hnsw_ef_search=77))
+        self.assertEqual(hnsw.hnsw.efSearch, 77)
+        ivf = build_index(self.vectors, index_params("ivf_flat", ivf_nprobe=100))
+        # nprobe is capped at the number of lists
+        self.assertEqual(faiss.extract_index_ivf(ivf).nprobe, 4)
+
+    def test_too_few_vectors_for_pq_falls_back_to_flat(self):
+        index = build_index(self.vectors[:10], index_params("ivf_pq", pq_nbits=8))
+        self.assertEqual(index.ntotal, 10)
+        self.assertEqual(type(index).__name__, "IndexFlatL2")
+
+    def test_invalid_parameters_raise(self):
+        with self.assertRaises(ValueError):
+            build_index(self.vectors, index_params("annoy"))
+        with self.assertRaises(ValueError):
+            build_index(self.vectors, index_params("ivf_pq", pq_m=5))
+
+    def test_signature_ignores_search_time_parameters(self):
+        self.assertEqual(build_signature(index_params("hnsw")), build_signature(index_params("hnsw", hnsw_ef_search=1)))
+        self.assertNotEqual(build_signature(index_params("hnsw")), build_signature(index_params("hnsw", hnsw_m=16)))
+        self.assertNotEqual(build_signature(index_params("flat")), build_signature(index_params("ivf_flat")))
+
+    def test_subset_search_returns_only_allowed_positions(self):
+        subset = np.arange(0, len(self.vectors), 7)
+        query = self.vectors[3]
+        distances = ((self.vectors[subset] - query) ** 2).sum(axis=1)
+        nearest = subset[np.argsort(distances)[:5]]
+        for index_type in INDEX_TYPES:
+            with self.subTest(index_type=index_type):
+                params = index_params(index_type)
+                hits = search_subset(build_index(self.vectors, params), query, 5, subset, params)
+                self.assertEqual(len(hits), 5)
+                self.assertTrue(set(hits.tolist()) <= set(subset.tolist()))
+                if index_type == "flat":
+                    self.assertEqual(hits.tolist(), nearest.tolist())
+
+
+class BackgroundLoadTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = make_service(self.directory, FakeEmbeddings())
+        self.failures = 0
+
+    def flaky_load(self):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("index volume not mounted")
+        return "store"
+
+    def run_background_load(self, **overrides):
+        overrides.setdefault("INDEX_LOAD_RETRY_MAX_SECONDS", 0.02)
+        with mock.patch.object(self.service, "_load_or_create_vector_store", self.flaky_load), \
+                mock.patch.multiple(settings, **overrides):
+            self.service.start_background_load()
+            self.service._loader.join(timeout=5)
+
+    def test_failed_load_is_retried_until_it_succeeds(self):
+        self.failures = 2
+        self.run_background_load(INDEX_LOAD_RETRY_SECONDS=0.01)
+        self.assertTrue(self.service.is_ready)
+        self.assertEqual(self.service.load_attempts, 3)
+        self.assertIsNone(self.service.load_error)
+        self.assertEqual(self.service.vector_store, "store")
+
+    def test_retries_can_be_disabled(self):
+        self.failures = 1
+        self.run_background_load(INDEX_LOAD_RETRY_SECONDS=0)
+        self.assertFalse(self.service.is_ready)
+        self.assertEqual(self.service.load_attempts, 1)
+        self.assertEqual(self.service.load_error, "index volume not mounted")
+
+
+class SlowEmbeddings(FakeEmbeddings):
+
+    def __init__(self, delay, release=None):
+        super().__init__()
+        self.delay = delay
+        self.release = release
+
+    def embed_query(self, text):
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        time.sleep(self.delay)
+        return fake_vector(text)
+
+
+class QueryEmbeddingDeadlineTest(TempDirTestCase):
+
+    def embed_concurrently(self, service, count, deadline):
+        with mock.patch.object(settings, "RETRIEVAL_EMBEDDING_DEADLINE_SECONDS", deadline), \
+                ThreadPoolExecutor(max_workers=count) as searches:
+            return list(searches.map(service.embed_query_within_deadline, [f"topic {i}" for i in range(count)]))
+
+    def test_concurrent_generations_each_get_a_vector(self):
+        service = make_service(self.directory, SlowEmbeddings(0.2))
+        self.addCleanup(service._embed_executor.shutdown)
+        vectors = self.embed_concurrently(service, settings.LLM_MAX_CONCURRENT_GENERATIONS, 1.5)
+        self.assertEqual(vectors, [fake_vector(f"topic {i}") for i in range(len(vectors))])
+
+    def test_pool_is_never_smaller_than_generation_concurrency(self):
+        with mock.patch.object(settings, "RETRIEVAL_EMBEDDING_WORKERS", 2):
+            service = make_service(self.directory, FakeEmbeddings())
+        self.addCleanup(service._embed_executor.shutdown)
+        self.assertEqual(service._embed_executor._max_workers, settings.LLM_MAX_CONCURRENT_GENERATIONS)
+
+    def test_waiting_for_a_worker_counts_against_the_deadline(self):
+        release = threading.Event()
+        with mock.patch.multiple(settings, RETRIEVAL_EMBEDDING_WORKERS=1, LLM_MAX_CONCURRENT_GENERATIONS=1):
+            service = make_service(self.directory, SlowEmbeddings(0, release))
+        self.addCleanup(service._embed_executor.shutdown)
+        self.addCleanup(release.set)
+
+        started = time.monotonic()
+        self.assertEqual(self.embed_concurrently(service, 2, 0.2), [None, None])
+        self.assertLess(time.monotonic() - started, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
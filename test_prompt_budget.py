@@ -0,0 +1,90 @@
+"""
+Unit tests for token-budgeted prompt assembly:
+1. Fitting optional sections into the budget (PromptBudgeter.fit)
+2. Rendering the kept items into chat messages
+"""
+import sys
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+from app.services import prompt_templates
+from app.services.prompt_budget import PromptBudgeter
+
+
+def make_budgeter(budget, **kwargs):
+    # An unknown encoding selects the len // 4 estimate, so counts don't depend on downloading a tokenizer
+    return PromptBudgeter(budget, encoding_name="test-estimate", **kwargs)
+
+
+class PromptBudgeterTest(unittest.TestCase):
+
+    def test_sections_are_filled_round_robin(self):
+        budgeter = make_budgeter(100, max_item_tokens=0)
+        a_items = ["a" * 80, "A" * 80, "á" * 80]
+        b_items = ["b" * 80, "B" * 80]
+        kept, report = budgeter.fit(["x" * 40], [("a", a_items), ("b", b_items)])
+
+        # Each item costs 20 tokens; after a0, b0, a1 and b1 only 10 remain for a2
+        self.assertEqual(kept, {"a": a_items[:2], "b": b_items})
+        self.assertEqual(report["required"], 10)
+        self.assertEqual((report["a"], report["b"]), (40, 40))
+        self.assertEqual(report["dropped_items"], 1)
+        self.assertEqual(report["total"], 90)
+
+    def test_last_item_is_truncated_when_enough_room_remains(self):
+        budgeter = make_budgeter(60, max_item_tokens=0, min_item_tokens=10)
+        kept, report = budgeter.fit([], [("examples", ["a" * 200, "b" * 200])])
+
+        self.assertEqual(kept["examples"][0], "a" * 200)
+        self.assertTrue(kept["examples"][1].startswith("b"))
+        self.assertTrue(kept["examples"][1].endswith("…"))
+        self.assertLessEqual(report["total"], 60)
+        self.assertEqual(report["dropped_items"], 0)
+
+    def test_items_are_capped_at_max_item_tokens(self):
+        budgeter = make_budgeter(1000, max_item_tokens=5)
+        kept, report = budgeter.fit([], [("history", ["word " * 40])])
+
+        self.assertEqual(len(kept["history"]), 1)
+        self.assertTrue(kept["history"][0].endswith("…"))
+        self.assertLessEqual(report["history"], 5)
+
+    def test_required_text_is_kept_even_over_budget(self):
+        budgeter = make_budgeter(10)
+        kept, report = budgeter.fit(["x" * 400], [("examples", ["example"])])
+
+        self.assertEqual(kept, {"examples": []})
+        self.assertEqual(report["required"], 100)
+        self.assertEqual(report["dropped_items"], 1)
+
+    def test_empty_sections_are_reported(self):
+        kept, report = make_budgeter(100).fit(["x"], [("examples", []), ("history", [])])
+        self.assertEqual(kept, {"examples": [], "history": []})
+        self.assertEqual((report["examples"], report["history"], report["dropped_items"]), (0, 0, 0))
+
+
+class RenderMessagesTest(unittest.TestCase):
+
+    def render_context(self, history, examples):
+        messages = prompt_templates.render_messages("static", history, examples, "", "remote work")
+        return messages[1]["content"]
+
+    def test_truncated_item_keeps_separator(self):
+        history = [f"User request: {topic}\nGenerated post: " + "long " * 100 + "\n\n" for topic in ("first", "second")]
+        kept, _ = make_budgeter(1000, max_item_tokens=20).fit([], [("history", history)])
+        context = self.render_context(kept["history"], [])
+
+        self.assertNotIn("…User request", context)
+        self.assertIn("…\n\nUser request: second", context)
+
+    def test_items_are_separated_by_a_blank_line(self):
+        context = self.render_context(["User request: a\n\n", "User request: b\n\n"], ["Example 1:\npost…"])
+        self.assertIn("User request: a\n\nUser request: b\n\n", context)
+        self.assertIn("Example 1:\npost…\n\nTOPIC OR REQUEST:", context)
+
+
+if __name__ == "__main__":
+    unittest.main()
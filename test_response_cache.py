@@ -0,0 +1,148 @@
+"""
+Unit tests for the semantic response cache used to reuse generated posts:
+1. Similarity lookup, expiry and eviction
+2. How LLMService scopes cached drafts
+3. Keeping a request's retrieval filters when its topic is searched again
+"""
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+import testing_support  # noqa: F401  (Azure settings defaults)
+
+from app.core.config import settings
+from app.services.llm_service import LLMService, RetrievalContext
+from app.services.response_cache import SemanticResponseCache
+
+
+class SemanticResponseCacheTest(unittest.TestCase):
+
+    def test_similar_vector_hits_and_returns_stored_value(self):
+        cache = SemanticResponseCache(similarity_threshold=0.95)
+        value = {"texts": ["post"], "hook": "h", "framework": "f", "cta": "c"}
+        cache.put(("pro", 1), [1.0, 0.0, 0.0], value)
+
+        self.assertIs(cache.get(("pro", 1), [0.99, 0.05, 0.0]), value)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_dissimilar_vector_misses(self):
+        cache = SemanticResponseCache(similarity_threshold=0.95)
+        cache.put("key", [1.0, 0.0], "post")
+        self.assertIsNone(cache.get("key", [0.0, 1.0]))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_lookup_is_scoped_to_exact_key(self):
+        cache = SemanticResponseCache()
+        cache.put(("pro", 2), [1.0, 0.0], "two drafts")
+        self.assertIsNone(cache.get(("pro", 1), [1.0, 0.0]))
+        self.assertEqual(cache.get(("pro", 2), [1.0, 0.0]), "two drafts")
+
+    def test_closest_entry_wins(self):
+        cache = SemanticResponseCache(similarity_threshold=0.5)
+        cache.put("key", [1.0, 0.0], "far")
+        cache.put("key", [0.8, 0.6], "near")
+        self.assertEqual(cache.get("key", [0.7, 0.7]), "near")
+
+    def test_scale_does_not_matter(self):
+        cache = SemanticResponseCache()
+        cache.put("key", [2.0, 0.0], "post")
+        self.assertEqual(cache.get("key", [10.0, 0.0]), "post")
+
+    def test_expired_entries_are_dropped(self):
+        cache = SemanticResponseCache(ttl_seconds=60)
+        cache.put("key", [1.0, 0.0], "post")
+        next(iter(cache._entries.values()))["created_at"] -= 120
+        self.assertIsNone(cache.get("key", [1.0, 0.0]))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = SemanticResponseCache(max_entries=2)
+        cache.put("a", [1.0, 0.0], "a")
+        cache.put("b", [1.0, 0.0], "b")
+        cache.get("a", [1.0, 0.0])
+        cache.put("c", [1.0, 0.0], "c")
+
+        self.assertEqual(cache.get("a", [1.0, 0.0]), "a")
+        self.assertIsNone(cache.get("b", [1.0, 0.0]))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+
+class FakeEmbeddings:
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+class FakeVectorStoreService:
+
+    def __init__(self):
+        self.embeddings = FakeEmbeddings()
+        self.timed_out = False
+        self.searches = []
+
+    def search_similar_posts(self, query, k=3, filters=None):
+        self.searches.append((query, filters))
+        return []
+
+    def embed_query_within_deadline(self, query, fallback="using lexical results only"):
+        return None if self.timed_out else self.embeddings.embed_query(query)
+
+
+class LLMServiceResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vector_store_service = FakeVectorStoreService()
+        with mock.patch.object(settings, "RESPONSE_CACHE_ENABLED", True), \
+                mock.patch.object(settings, "CLIENT_STATE_BACKEND", "memory"):
+            self.service = LLMService(self.vector_store_service)
+        self.addCleanup(self.service.client_state.close)
+
+    def generation(self, client_id, user_tier="copywriter", is_pro_user=True):
+        return self.service._prepare_generation("remote work", client_id, is_pro_user, None, user_tier)
+
+    def cache(self, client_id, user_tier="copywriter"):
+        generation = self.generation(client_id, user_tier)
+        self.assertIsNone(self.service._lookup_cached_response(generation, 2, use_cache=True))
+        self.service._store_cached_response(generation, 2, ["draft one", "draft two"])
+
+    def lookup(self, client_id, user_tier="copywriter", is_pro_user=True):
+        return self.service._lookup_cached_response(self.generation(client_id, user_tier, is_pro_user), 2, True)
+
+    def test_same_client_and_tier_hits(self):
+        self.cache("acme")
+        self.assertEqual(self.lookup("acme"), ["draft one", "draft two"])
+
+    def test_drafts_are_not_served_to_another_client(self):
+        self.cache("acme")
+        self.assertIsNone(self.lookup("globex"))
+
+    def test_drafts_are_not_served_to_another_tier(self):
+        self.cache("acme", user_tier="copywriter")
+        self.assertIsNone(self.lookup("acme", user_tier="pro"))
+
+    def test_embedding_timeout_is_a_miss(self):
+        self.cache("acme")
+        self.vector_store_service.timed_out = True
+        generation = self.generation("acme")
+        self.assertIsNone(self.service._lookup_cached_response(generation, 2, use_cache=True))
+        # Without a topic vector the finished drafts can't be stored either
+        self.assertNotIn("cache_vector", generation)
+
+
+    def test_stale_retrieval_context_is_searched_again_with_its_filters(self):
+        filters = {"profile_name": "Ada Lovelace"}
+        context = RetrievalContext(topic="an older topic", documents=[], filters=filters)
+        generation = self.service._prepare_generation("remote work", "acme", True, context, "copywriter")
+        self.service._build_prompt(**generation["prompt_kwargs"])
+
+        self.assertEqual(len(self.vector_store_service.searches), 1)
+        self.assertEqual(self.vector_store_service.searches[0][1], filters)
+
+
+if __name__ == "__main__":
+    unittest.main()
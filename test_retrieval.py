@@ -0,0 +1,206 @@
+"""
+Unit tests for the retrieval building blocks:
+1. Ingest filtering (PostFilter)
+2. Metadata partitions used for filtered search
+3. BM25, reciprocal rank fusion and MMR re-ranking
+4. Caching query embeddings
+"""
+import sys
+import unittest
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+from app.services.bm25 import BM25Index, write_bm25_index
+from app.services.dedup import PostFilter
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from app.services.partitions import MetadataPartitions, write_partitions
+from app.services.rerank import mmr_select, reciprocal_rank_fusion
+from testing_support import TempDirTestCase
+
+POST = "Hiring a remote team taught me that clear written updates beat long meetings every single week."
+
+
+class PostFilterTest(unittest.TestCase):
+
+    def test_short_posts_are_rejected(self):
+        post_filter = PostFilter(min_chars=20, min_words=4)
+        self.assertFalse(post_filter.accept("agree?"))
+        self.assertFalse(post_filter.accept("a b " + "x" * 30))
+        self.assertTrue(post_filter.accept(POST))
+        self.assertEqual(post_filter.stats["too_short"], 2)
+
+    def test_exact_and_near_duplicates_are_rejected(self):
+        post_filter = PostFilter(max_distance=3)
+        self.assertTrue(post_filter.accept(POST))
+        self.assertFalse(post_filter.accept(POST))
+        self.assertFalse(post_filter.accept(POST.upper() + "  "))
+        self.assertEqual(post_filter.stats["near_duplicates"], 2)
+
+    def test_different_posts_are_kept(self):
+        post_filter = PostFilter()
+        self.assertTrue(post_filter.accept(POST))
+        self.assertTrue(post_filter.accept("Pricing experiments failed until we started talking to churned customers first."))
+        self.assertEqual(post_filter.stats["kept"], 2)
+
+    def test_dedup_can_be_disabled(self):
+        post_filter = PostFilter(dedup=False)
+        self.assertTrue(post_filter.accept(POST))
+        self.assertTrue(post_filter.accept(POST))
+
+    def test_summary_reports_counts(self):
+        post_filter = PostFilter(min_words=3)
+        post_filter.accept(POST)
+        post_filter.accept(POST)
+        post_filter.accept("hi")
+        self.assertIn("1 of 3 posts kept", post_filter.summary())
+
+
+class MetadataPartitionsTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metadatas = [
+            {"profile_name": "Ada Lovelace", "profile_url": "https://x/ada/", "post_date": "2024-01-15"},
+            {"profile_name": "Grace Hopper", "profile_url": "https://x/grace", "post_date": "2024-03-01"},
+            {"profile_name": "ada lovelace", "profile_url": "https://x/ada", "post_date": "2024-06-30"},
+            {"profile_name": "Grace Hopper", "profile_url": "https://x/grace", "post_date": "not a date"},
+            # Bundled CSV layout: placeholder name, author in post_date
+            {"profile_name": "Unknown", "profile_url": "https://x/alan", "post_date": "Alan Turing"},
+        ]
+        write_partitions(self.directory, metadatas)
+        self.partitions = MetadataPartitions(self.directory)
+
+    def test_no_filter_selects_nothing(self):
+        self.assertIsNone(self.partitions.select())
+
+    def test_profile_filters_are_case_and_slash_insensitive(self):
+        self.assertEqual(self.partitions.select(profile_name="ADA LOVELACE").tolist(), [0, 2])
+        self.assertEqual(self.partitions.select(profile_url="https://x/ada/").tolist(), [0, 2])
+        self.assertEqual(self.partitions.select(profile_name="nobody").tolist(), [])
+
+    def test_date_range_excludes_undated_posts(self):
+        self.assertEqual(self.partitions.select(date_from=date(2024, 2, 1)).tolist(), [1, 2])
+        self.assertEqual(self.partitions.select(date_to=date(2024, 3, 1)).tolist(), [0, 1])
+
+    def test_filters_are_intersected(self):
+        selected = self.partitions.select(profile_name="Grace Hopper", date_from=date(2024, 1, 1))
+        self.assertEqual(selected.tolist(), [1])
+
+    def test_placeholder_name_falls_back_to_author_in_date_column(self):
+        self.assertEqual(self.partitions.select(profile_name="Alan Turing").tolist(), [4])
+        self.assertEqual(self.partitions.select(profile_name="Unknown").tolist(), [])
+
+
+class BM25IndexTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        texts = [
+            "remote hiring lessons for startup founders",
+            "pricing experiments and churn",
+            "remote work remote teams remote culture",
+            "the and of to",
+        ]
+        self.assertEqual(write_bm25_index(self.directory, texts), 4)
+        self.index = BM25Index(self.directory)
+
+    def test_matching_documents_rank_by_score(self):
+        results = self.index.search("remote teams", k=10)
+        self.assertEqual([position for position, _ in results], [2, 0])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_k_limits_results(self):
+        self.assertEqual(len(self.index.search("remote", k=1)), 1)
+
+    def test_candidates_restrict_results(self):
+        results = self.index.search("remote", k=10, candidates=np.array([0, 1]))
+        self.assertEqual([position for position, _ in results], [0])
+
+    def test_stopwords_and_unknown_terms_match_nothing(self):
+        self.assertEqual(self.index.search("the and", k=10), [])
+        self.assertEqual(self.index.search("blockchain", k=10), [])
+
+
+class RerankTest(unittest.TestCase):
+
+    def test_rrf_rewards_items_ranked_by_both_lists(self):
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+        self.assertEqual([item for item, _ in fused][:2], [1, 3])
+        self.assertAlmostEqual(dict(fused)[1], 1 / 61 + 1 / 62)
+        self.assertAlmostEqual(dict(fused)[4], 1 / 63)
+
+    def test_mmr_with_full_relevance_keeps_similarity_order(self):
+        candidates = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]])
+        self.assertEqual(mmr_select([1.0, 0.0], candidates, 3, lambda_mult=1.0), [0, 1, 2])
+
+    def test_mmr_prefers_diverse_candidates(self):
+        candidates = np.array([[1.0, 0.0], [0.99, 0.01], [0.6, 0.8]])
+        self.assertEqual(mmr_select([1.0, 0.0], candidates, 2, lambda_mult=0.3), [0, 2])
+
+    def test_mmr_caps_posts_per_author(self):
+        candidates = np.array([[1.0, 0.0], [0.9, 0.1], [0.8, 0.2]])
+        order = mmr_select([1.0, 0.0], candidates, 3, lambda_mult=1.0, authors=["a", "a", "b"], max_per_author=1)
+        self.assertEqual(order, [0, 2])
+
+    def test_mmr_uses_precomputed_relevance(self):
+        candidates = np.array([[1.0, 0.0], [0.0, 1.0]])
+        self.assertEqual(mmr_select(None, candidates, 1, relevance=[0.1, 0.9]), [1])
+
+    def test_mmr_handles_empty_input(self):
+        self.assertEqual(mmr_select([1.0, 0.0], np.empty((0, 2)), 3), [])
+        self.assertEqual(mmr_select([1.0, 0.0], np.array([[1.0, 0.0]]), 0), [])
+
+
+class RecordingEmbeddings:
+
+    def __init__(self):
+        self.queries = []
+
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text))]
+
+
+class CachedEmbeddingsTest(TempDirTestCase):
+
+    def test_query_is_embedded_as_typed(self):
+        model = RecordingEmbeddings()
+        embeddings = CachedEmbeddings(model, EmbeddingCache("test"))
+        embeddings.embed_query("  Hiring   a REMOTE team ")
+        self.assertEqual(model.queries, ["  Hiring   a REMOTE team "])
+
+    def test_spacing_and_case_variants_share_an_entry(self):
+        model = RecordingEmbeddings()
+        cache = EmbeddingCache("test")
+        embeddings = CachedEmbeddings(model, cache)
+        first = embeddings.embed_query("Remote  work")
+        self.assertEqual(embeddings.embed_query("remote work"), first)
+        self.assertEqual(len(model.queries), 1)
+        self.assertEqual(cache.stats()["memory_hits"], 1)
+
+    def test_vectors_survive_a_restart(self):
+        path = str(self.directory / "embeddings.db")
+        CachedEmbeddings(RecordingEmbeddings(), EmbeddingCache("test", db_path=path)).embed_query("remote work")
+
+        model = RecordingEmbeddings()
+        cache = EmbeddingCache("test", db_path=path)
+        self.assertEqual(CachedEmbeddings(model, cache).embed_query("Remote work"), [11.0])
+        self.assertEqual(model.queries, [])
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+
+    def test_deployments_do_not_share_vectors(self):
+        path = str(self.directory / "embeddings.db")
+        CachedEmbeddings(RecordingEmbeddings(), EmbeddingCache("small", db_path=path)).embed_query("remote work")
+        self.assertIsNone(EmbeddingCache("large", db_path=path).get("remote work"))
+
+
+if __name__ == "__main__":
+    unittest.main()
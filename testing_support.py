@@ -0,0 +1,26 @@
+"""
+Shared fixtures for the unit tests. Import this before any ``app`` module:
+the app settings require the Azure variables even when a test never calls Azure.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+for name in (
+    "AZURE_OPENAI_API_KEY",
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_DEPLOYMENT_NAME",
+    "AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME",
+    "AZURE_OPENAI_API_VERSION",
+):
+    os.environ.setdefault(name, "test")
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Gives each test a fresh ``self.directory`` that is removed afterwards."""
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)